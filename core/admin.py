@@ -1,16 +1,26 @@
 from django.contrib import admin
 from django.core.exceptions import ValidationError
-from .models import Pet, PetVaccine, VaccineReminder, LoginCode, Species, Breed, UserProfile, PetUser, PetWeight
+from django.db import transaction
+from .catalog import bump_catalog_version
+from .models import Pet, PetVaccine, VaccineReminder, LoginCode, Species, Breed, UserProfile, PetUser, PetWeight, NotificationOutbox
+
+
+class CatalogAdminMixin:
+    """El borrado masivo del admin no pasa por Model.delete(), así que invalida aquí el catálogo"""
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        transaction.on_commit(bump_catalog_version)
 
 
 @admin.register(Species)
-class SpeciesAdmin(admin.ModelAdmin):
+class SpeciesAdmin(CatalogAdminMixin, admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
 
 @admin.register(Breed)
-class BreedAdmin(admin.ModelAdmin):
+class BreedAdmin(CatalogAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'species')
     search_fields = ('name', 'species__name')
     list_filter = ('species',)
@@ -89,7 +99,7 @@ class VaccineReminderAdmin(admin.ModelAdmin):
     list_filter = ('reminder_type', 'notification_method', 'is_sent', 'is_active', 'created_at')
     search_fields = ('pet_vaccine__vaccine_name', 'pet_vaccine__pet__name', 'user__email', 'user__username')
     date_hierarchy = 'reminder_date'
-    readonly_fields = ('is_sent', 'sent_at', 'created_at', 'updated_at')
+    readonly_fields = ('is_sent', 'sent_at', 'claimed_by', 'claimed_at', 'created_at', 'updated_at')
     
     fieldsets = (
         ('Información Principal', {
@@ -99,7 +109,7 @@ class VaccineReminderAdmin(admin.ModelAdmin):
             'fields': ('reminder_date', 'days_before', 'message')
         }),
         ('Estado', {
-            'fields': ('is_active', 'is_sent', 'sent_at')
+            'fields': ('is_active', 'is_sent', 'sent_at', 'claimed_by', 'claimed_at')
         }),
         ('Fechas', {
             'fields': ('created_at', 'updated_at'),
@@ -108,4 +118,15 @@ class VaccineReminderAdmin(admin.ModelAdmin):
     )
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('pet_vaccine', 'user', 'pet_vaccine__pet')
\ No newline at end of file
+        return super().get_queryset(request).select_related('pet_vaccine', 'user', 'pet_vaccine__pet')
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('reminder', 'status', 'attempts', 'next_attempt_at', 'last_attempt_at')
+    list_filter = ('status',)
+    search_fields = ('reminder__user__email', 'reminder__pet_vaccine__vaccine_name', 'last_error')
+    readonly_fields = ('reminder', 'attempts', 'last_attempt_at', 'last_error', 'created_at', 'updated_at')
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('reminder__pet_vaccine__pet', 'reminder__user')
@@ -0,0 +1,76 @@
+"""
+Caché del catálogo de especies y razas.
+
+El catálogo casi no cambia (lo siembra populate_breeds), así que su versión
+serializada se guarda en dos niveles: un dict en memoria del proceso y la caché
+compartida de Django (Redis si hay REDIS_URL). Ambos niveles se indexan por una
+versión de catálogo que cambia cada vez que se guarda o borra una especie o raza,
+de modo que nunca se sirve un catálogo desactualizado ni hace falta invalidar
+claves una a una. La versión se cambia en transaction.on_commit, cuando los
+datos nuevos ya son visibles para las demás conexiones.
+
+Requiere una caché compartida (REDIS_URL) en cuanto haya más de un proceso
+(varios workers de gunicorn o réplicas): con la caché en memoria local cada
+proceso tiene su propia versión, y un cambio hecho en uno no invalida el
+catálogo de los demás hasta que vence CATALOG_CACHE_TIMEOUT.
+"""
+import unicodedata
+import uuid
+
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Tiempo de vida en la caché compartida y max-age de las respuestas HTTP
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+
+_local_catalog = {}
+
+
+def get_catalog_version():
+    """Versión actual del catálogo; se inicializa si no existe en la caché"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalida el catálogo cacheado. Se usa un token nuevo en vez de un contador
+    para que una versión perdida por la caché nunca vuelva a coincidir con
+    datos viejos.
+    """
+    cache.set(CATALOG_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    _local_catalog.clear()
+
+
+def get_cached_catalog(name, build, version=None):
+    """
+    Devuelve el catálogo `name` para la versión actual, construyéndolo con
+    `build()` solo si no está en memoria ni en la caché compartida.
+    """
+    version = version or get_catalog_version()
+    key = f'catalog:{name}:{version}'
+
+    if key in _local_catalog:
+        return _local_catalog[key]
+
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, CATALOG_CACHE_TIMEOUT)
+
+    # Descartar entradas locales de versiones anteriores
+    for stale_key in [k for k in _local_catalog if not k.endswith(f':{version}')]:
+        del _local_catalog[stale_key]
+    _local_catalog[key] = data
+    return data
+
+
+def normalize_search_text(value):
+    """Minúsculas, sin tildes y con espacios simples: "Bichón  Frisé" -> "bichon frise" """
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    without_accents = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(without_accents.lower().split())
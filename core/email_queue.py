@@ -0,0 +1,110 @@
+"""
+Envío de correos en segundo plano para las vistas.
+
+Las peticiones encolan el mensaje y responden de inmediato; un hilo del proceso
+lo entrega con el EMAIL_BACKEND configurado (Resend en producción). Así un
+proveedor lento no bloquea los workers de gunicorn. Los fallos no llegan a la
+respuesta HTTP: se registran en el log y en los contadores de get_stats().
+
+La cola es acotada (EMAIL_QUEUE_MAX_SIZE): si se llena, el mensaje se envía en
+la propia petición en lugar de descartarse. Con EMAIL_ASYNC = False todo se
+envía en línea.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class EmailQueue:
+    """Cola en memoria atendida por un hilo daemon que se arranca en el primer uso"""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'inline': 0}
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='email-queue', daemon=True)
+                self.thread.start()
+
+    def enqueue(self, message):
+        self.start()
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            logger.warning('Email queue full (%s messages), sending inline', self.queue.maxsize)
+            self.count('inline')
+            self.deliver(message)
+            return
+        self.count('queued')
+
+    def deliver(self, message):
+        try:
+            message.send(fail_silently=False)
+            self.count('sent')
+        except Exception:
+            self.count('failed')
+            logger.exception('Failed to send email "%s" to %s', message.subject, ', '.join(message.to))
+
+    def run(self):
+        while True:
+            message = self.queue.get()
+            try:
+                self.deliver(message)
+            finally:
+                self.queue.task_done()
+
+    def flush(self, timeout=None):
+        """Espera a que se entreguen los mensajes encolados; False si vence el timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+
+_email_queue = None
+_email_queue_lock = threading.Lock()
+
+
+def get_email_queue():
+    """Cola compartida del proceso"""
+    global _email_queue
+    with _email_queue_lock:
+        if _email_queue is None:
+            _email_queue = EmailQueue(getattr(settings, 'EMAIL_QUEUE_MAX_SIZE', 1000))
+            # Al apagar el worker, dar unos segundos para vaciar la cola
+            atexit.register(_email_queue.flush, timeout=5)
+        return _email_queue
+
+
+def send_async(message):
+    """Entrega un EmailMessage en segundo plano (o en línea con EMAIL_ASYNC = False)"""
+    email_queue = get_email_queue()
+    if getattr(settings, 'EMAIL_ASYNC', True):
+        email_queue.enqueue(message)
+    else:
+        email_queue.deliver(message)
+
+
+def get_stats():
+    """Contadores del proceso: encolados, enviados, fallidos y enviados en línea por cola llena"""
+    email_queue = get_email_queue()
+    with email_queue.lock:
+        return {**email_queue.stats, 'pending': email_queue.queue.unfinished_tasks}
@@ -0,0 +1,43 @@
+"""
+Correos transaccionales de la API.
+
+Las plantillas se compilan una sola vez al importar el módulo, no en cada
+petición. El logo se referencia por URL (archivo estático servido por
+WhiteNoise, o EMAIL_LOGO_URL) en lugar de incrustarse en base64, y cada correo
+lleva una versión de texto plano además del HTML.
+"""
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import get_template
+from django.templatetags.static import static
+
+LOGIN_CODE_SUBJECT = 'Tu código de acceso a Petfans'
+LOGIN_CODE_HTML = get_template('core/emails/login_code.html')
+LOGIN_CODE_TEXT = get_template('core/emails/login_code.txt')
+
+EMAIL_LOGO_PATH = 'core/img/petfans-logo.png'
+
+
+def get_logo_url(request=None):
+    """
+    URL absoluta del logo: EMAIL_LOGO_URL o, en desarrollo, el estático servido
+    por esta misma API (producción exige EMAIL_LOGO_URL con https)
+    """
+    configured = getattr(settings, 'EMAIL_LOGO_URL', None)
+    if configured:
+        return configured
+    path = static(EMAIL_LOGO_PATH)
+    return request.build_absolute_uri(path) if request else path
+
+
+def build_login_code_email(email, code, request=None):
+    """Correo con el código de login, en texto plano con alternativa HTML"""
+    context = {'code': code, 'logo_url': get_logo_url(request)}
+    message = EmailMultiAlternatives(
+        subject=LOGIN_CODE_SUBJECT,
+        body=LOGIN_CODE_TEXT.render(context).strip(),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[email],
+    )
+    message.attach_alternative(LOGIN_CODE_HTML.render(context), 'text/html')
+    return message
@@ -0,0 +1,70 @@
+"""
+Almacenamiento de los códigos de login sin contraseña.
+
+LOGIN_CODE_STORE en settings elige la implementación:
+
+- ModelLoginCodeStore (por defecto): tabla core_logincode, como siempre.
+- CacheLoginCodeStore: caché de Django (Redis con REDIS_URL, memoria local en
+  tests), con TTL igual a la validez del código y sin escrituras en la base.
+
+Ambas consumen el código con una única operación atómica, de modo que dos
+verificaciones simultáneas del mismo código nunca lo aceptan dos veces.
+"""
+import hashlib
+import random
+import string
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import LoginCode
+
+DEFAULT_LOGIN_CODE_STORE = 'core.login_codes.ModelLoginCodeStore'
+
+
+def generate_code():
+    """Código numérico de 6 dígitos"""
+    return ''.join(random.choices(string.digits, k=6))
+
+
+class ModelLoginCodeStore:
+    """Códigos en la tabla LoginCode (se purgan con purge_login_codes)"""
+
+    def issue(self, email):
+        code = generate_code()
+        LoginCode.objects.create(email=email, code=code)
+        return code
+
+    def consume(self, email, code):
+        # Un solo UPDATE condicionado a used=False: solo una verificación concurrente lo marca
+        return LoginCode.objects.filter(
+            email=email,
+            code=code,
+            used=False,
+            created_at__gte=timezone.now() - LoginCode.VALIDITY
+        ).update(used=True) > 0
+
+
+class CacheLoginCodeStore:
+    """Códigos en la caché de Django con TTL de LoginCode.VALIDITY"""
+    key_prefix = 'login-code'
+
+    def key(self, email, code):
+        digest = hashlib.sha256(f'{email}:{code}'.encode()).hexdigest()
+        return f'{self.key_prefix}:{digest}'
+
+    def issue(self, email):
+        code = generate_code()
+        cache.set(self.key(email, code), 1, timeout=int(LoginCode.VALIDITY.total_seconds()))
+        return code
+
+    def consume(self, email, code):
+        # delete() devuelve True solo a quien borró la clave: canje atómico de un solo uso
+        return cache.delete(self.key(email, code))
+
+
+def get_login_code_store():
+    """Instancia el almacenamiento configurado en LOGIN_CODE_STORE"""
+    return import_string(getattr(settings, 'LOGIN_CODE_STORE', DEFAULT_LOGIN_CODE_STORE))()
@@ -0,0 +1,161 @@
+"""
+Envío de correo por la API de Resend.
+
+El SDK de resend abre una conexión HTTPS nueva en cada llamada. Aquí un único
+cliente por proceso mantiene una requests.Session (keep-alive y pool de
+conexiones), y ResendEmailBackend lo expone como EMAIL_BACKEND de Django: el
+código de login y los recordatorios envían con la API de correo de Django,
+comparten conexiones y, cuando hay varios mensajes, salen por /emails/batch
+(hasta 100 por llamada).
+"""
+import hashlib
+import json
+import threading
+
+import requests
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from requests.adapters import HTTPAdapter
+
+# Máximo de correos por llamada a /emails/batch
+RESEND_BATCH_LIMIT = 100
+
+
+class ResendError(Exception):
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def rejected(self):
+        """Resend rechazó la petición por su contenido (4xx salvo 429), así que no envió nada"""
+        return self.status_code is not None and 400 <= self.status_code < 500 and self.status_code != 429
+
+
+class ResendClient:
+    """Cliente mínimo de la API de Resend sobre una sesión HTTP persistente"""
+
+    def __init__(self, api_key, api_url='https://api.resend.com', timeout=10, pool_size=10):
+        self.api_url = api_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session()
+        # pool_size acota las conexiones abiertas; conviene >= --concurrency de los recordatorios
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'Authorization': f'Bearer {api_key}',
+            'Accept': 'application/json',
+            'User-Agent': 'petfans',
+        })
+
+    def post(self, path, payload, headers=None):
+        response = self.session.post(f'{self.api_url}{path}', json=payload, headers=headers, timeout=self.timeout)
+        if response.status_code >= 400:
+            try:
+                message = response.json().get('message', response.text)
+            except ValueError:
+                message = response.text
+            raise ResendError(f'Resend API error {response.status_code}: {message}', status_code=response.status_code)
+        return response.json()
+
+    def send(self, email):
+        """Envía un correo (parámetros de la API de Resend)"""
+        return self.post('/emails', email)
+
+    def send_batch(self, emails):
+        """Envía los correos en llamadas de hasta RESEND_BATCH_LIMIT; devuelve los ids creados"""
+        results = []
+        for start in range(0, len(emails), RESEND_BATCH_LIMIT):
+            chunk = emails[start:start + RESEND_BATCH_LIMIT]
+            response = self.post('/emails/batch', chunk, headers={'Idempotency-Key': idempotency_key(chunk)})
+            results.extend(response.get('data', []))
+        return results
+
+
+def idempotency_key(payload):
+    """
+    Clave derivada del contenido: si el mismo lote se reintenta tras un timeout,
+    Resend (durante 24 h) devuelve el resultado anterior en vez de reenviarlo
+    """
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Cliente compartido del proceso, creado en el primer uso"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ResendClient(
+                settings.RESEND_API_KEY,
+                api_url=getattr(settings, 'RESEND_API_URL', 'https://api.resend.com'),
+                timeout=getattr(settings, 'RESEND_TIMEOUT', 10),
+                pool_size=getattr(settings, 'RESEND_POOL_SIZE', 10),
+            )
+        return _client
+
+
+def to_resend_params(message):
+    """Convierte un EmailMessage de Django en los parámetros de la API de Resend"""
+    params = {
+        'from': message.from_email or settings.DEFAULT_FROM_EMAIL,
+        'to': list(message.to),
+        'subject': message.subject,
+    }
+    if message.cc:
+        params['cc'] = list(message.cc)
+    if message.bcc:
+        params['bcc'] = list(message.bcc)
+    if message.reply_to:
+        params['reply_to'] = list(message.reply_to)
+
+    if message.content_subtype == 'html':
+        params['html'] = message.body
+    else:
+        params['text'] = message.body
+    for content, mimetype in getattr(message, 'alternatives', []):
+        if mimetype == 'text/html':
+            params['html'] = content
+    return params
+
+
+class ResendEmailBackend(BaseEmailBackend):
+    """
+    EMAIL_BACKEND de Django sobre el cliente compartido. Un solo mensaje va a
+    /emails; varios, a /emails/batch, que Resend acepta o rechaza completo.
+    """
+    # Un lote de hasta max_batch_size mensajes sale en una sola llamada, que Resend
+    # acepta o rechaza completo (ver core.notifications.EmailBackend)
+    atomic_batches = True
+    max_batch_size = RESEND_BATCH_LIMIT
+
+    @staticmethod
+    def is_rejection(error):
+        """
+        True si el error asegura que no se envió nada. Tras un timeout, un corte
+        de conexión o un 5xx el lote pudo haberse entregado igualmente.
+        """
+        return isinstance(error, ResendError) and error.rejected
+
+    def send_messages(self, email_messages):
+        messages = [message for message in email_messages if message.recipients()]
+        if not messages:
+            return 0
+
+        try:
+            client = get_client()
+            params = [to_resend_params(message) for message in messages]
+            if len(params) == 1:
+                client.send(params[0])
+            else:
+                client.send_batch(params)
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+        return len(messages)
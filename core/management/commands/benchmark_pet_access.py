@@ -0,0 +1,122 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from core.models import Species, Pet, PetUser
+import random
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the JOIN + DISTINCT pet access filter with the EXISTS-based one '
+        'on a seeded dataset. All seeded rows are rolled back at the end.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users',
+            type=int,
+            default=500,
+            help='Number of users to seed (default: 500)',
+        )
+        parser.add_argument(
+            '--pets-per-user',
+            type=int,
+            default=4,
+            help='Pets owned by each seeded user (default: 4)',
+        )
+        parser.add_argument(
+            '--collaborators',
+            type=int,
+            default=3,
+            help='Extra users sharing each pet (default: 3)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=50,
+            help='Queries timed per strategy (default: 50)',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = self.seed(options['users'], options['pets_per_user'], options['collaborators'])
+            self.run_benchmark(users, options['repeat'])
+            # Nunca persistir los datos de prueba
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete, seeded data rolled back'))
+
+    def seed(self, user_count, pets_per_user, collaborators):
+        self.stdout.write(f'Seeding {user_count} users with {pets_per_user} pets each...')
+
+        species, _ = Species.objects.get_or_create(name='Perro')
+        suffix = random.randint(0, 10 ** 6)
+        users = User.objects.bulk_create([
+            User(username=f'bench-{suffix}-{i}', email=f'bench-{suffix}-{i}@example.com')
+            for i in range(user_count)
+        ])
+
+        pets = Pet.objects.bulk_create([
+            Pet(name=f'Bench {i}', species=species, description='x' * 500)
+            for i in range(user_count * pets_per_user)
+        ])
+
+        relationships = []
+        for index, pet in enumerate(pets):
+            owner = users[index // pets_per_user]
+            relationships.append(PetUser(pet=pet, user=owner, role='owner'))
+            for collaborator in random.sample(users, min(collaborators, len(users))):
+                if collaborator.pk != owner.pk:
+                    relationships.append(PetUser(pet=pet, user=collaborator, role='viewer'))
+        PetUser.objects.bulk_create(relationships, ignore_conflicts=True)
+
+        self.stdout.write(f'  - Pets: {len(pets)}')
+        self.stdout.write(f'  - PetUser rows: {PetUser.objects.filter(pet__in=pets).count()}')
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE core_pet')
+                cursor.execute('ANALYZE core_petuser')
+
+        return users
+
+    def strategies(self, user):
+        return {
+            'join + distinct': Pet.objects.filter(
+                is_active=True,
+                user_relationships__user=user
+            ).distinct(),
+            'exists': Pet.objects.filter(
+                PetUser.access_exists(user),
+                is_active=True
+            ),
+        }
+
+    def run_benchmark(self, users, repeat):
+        sample_user = users[0]
+        explain_options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+
+        for name, queryset in self.strategies(sample_user).items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\nPlan ({name}):'))
+            self.stdout.write(queryset.explain(**explain_options))
+
+        sampled_users = [random.choice(users) for _ in range(repeat)]
+        timings = {}
+        for name in self.strategies(sample_user):
+            start = time.perf_counter()
+            for user in sampled_users:
+                list(self.strategies(user)[name])
+            timings[name] = (time.perf_counter() - start) * 1000 / repeat
+
+        # Ambas estrategias deben devolver exactamente las mismas mascotas
+        results = [
+            sorted(queryset.values_list('pk', flat=True))
+            for queryset in self.strategies(sample_user).values()
+        ]
+        if results[0] != results[1]:
+            self.stdout.write(self.style.ERROR('Strategies returned different pets!'))
+
+        self.stdout.write(self.style.MIGRATE_HEADING('\nAverage time per query:'))
+        for name, elapsed in timings.items():
+            self.stdout.write(f'  - {name}: {elapsed:.2f} ms')
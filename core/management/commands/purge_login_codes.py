@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand
+from core.models import LoginCode
+import signal
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete used or expired login codes in small batches. Runs a single pass by default; '
+        'with --interval it keeps running and stops gracefully on SIGTERM/SIGINT.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Codes deleted per transaction (default: 1000)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0.1,
+            help='Seconds to pause between batches to leave room for other writers (default: 0.1)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Seconds between passes when running continuously; 0 runs a single pass (default: 0)',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        batch_size = max(1, options['batch_size'])
+
+        if options['interval'] > 0:
+            signal.signal(signal.SIGTERM, self.request_stop)
+            signal.signal(signal.SIGINT, self.request_stop)
+
+        while True:
+            deleted = self.purge(batch_size, options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f'Purged {deleted} login codes'))
+
+            if options['interval'] <= 0:
+                return
+            self.wait(options['interval'])
+            if self.stopping:
+                return
+
+    def request_stop(self, signum, frame):
+        self.stdout.write(self.style.WARNING('Shutdown requested, finishing current batch...'))
+        self.stopping = True
+
+    def purge(self, batch_size, pause):
+        """Borra por bloques hasta vaciar los purgables de esta pasada"""
+        total = 0
+        while not self.stopping:
+            deleted = LoginCode.purge_batch(batch_size)
+            total += deleted
+            if deleted < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+        return total
+
+    def wait(self, timeout):
+        """Duerme en tramos de 1s para atender SIGTERM a tiempo"""
+        deadline = time.monotonic() + timeout
+        while not self.stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(1.0, remaining))
@@ -0,0 +1,175 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from core.models import NotificationOutbox, VaccineReminder
+import logging
+import select
+import signal
+import time
+
+logger = logging.getLogger(__name__)
+
+# Canal que notifica el trigger de core_vaccinereminder (migración 0019, solo PostgreSQL)
+NOTIFY_CHANNEL = 'vaccine_reminders'
+
+
+class Command(BaseCommand):
+    help = (
+        'Keep running and send vaccine reminders as they come due. Sleeps until the next '
+        'reminder_date, wakes up early on new reminders (Postgres LISTEN/NOTIFY) and stops '
+        'gracefully on SIGTERM/SIGINT after the batch in progress. Errors are logged and the '
+        'loop retries with backoff on a fresh connection.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=60,
+            help='Maximum seconds between checks, also used when LISTEN/NOTIFY is unavailable (default: 60)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Reminders claimed per batch (default: 500)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of reminders sent in parallel (default: 1)',
+        )
+        parser.add_argument(
+            '--rate-limit',
+            type=float,
+            default=0,
+            help='Maximum sends per second per provider; 0 means unlimited',
+        )
+        parser.add_argument(
+            '--lease-seconds',
+            type=int,
+            default=600,
+            help='How long a claimed reminder stays reserved (default: 600)',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+        poll_interval = max(1.0, options['poll_interval'])
+        dispatch_options = {
+            'batch_size': options['batch_size'],
+            'concurrency': options['concurrency'],
+            'rate_limit': options['rate_limit'],
+            'lease_seconds': options['lease_seconds'],
+        }
+
+        listening = self.listen()
+        self.stdout.write(self.style.SUCCESS(
+            f'Reminder scheduler started (LISTEN/NOTIFY: {listening}, poll interval: {poll_interval}s)'
+        ))
+
+        failures = 0
+        while not self.stopping:
+            try:
+                # Tras un error la conexión es nueva y hay que volver a suscribirse
+                if listening is None:
+                    listening = self.listen()
+
+                call_command(
+                    'send_vaccine_reminders', stdout=self.stdout, stderr=self.stderr,
+                    should_stop=lambda: self.stopping, **dispatch_options
+                )
+                failures = 0
+
+                timeout = self.seconds_until_next_reminder(poll_interval)
+                self.stdout.write(f'Sleeping up to {timeout:.0f}s')
+                self.wait(timeout, listening)
+            except Exception:
+                # Un corte de la base o del proveedor no debe matar el proceso
+                failures += 1
+                backoff = self.backoff_seconds(failures, poll_interval)
+                logger.exception('Reminder scheduler iteration failed, retrying in %.0fs', backoff)
+                self.stderr.write(self.style.ERROR(f'Iteration failed, retrying in {backoff:.0f}s'))
+                self.reset_connection()
+                listening = None
+                self.wait(backoff, listening=False)
+
+        self.stdout.write(self.style.SUCCESS('Reminder scheduler stopped'))
+
+    @staticmethod
+    def backoff_seconds(failures, poll_interval):
+        """Espera exponencial tras fallos consecutivos (2s, 4s, 8s...), acotada por poll_interval"""
+        return min(poll_interval, 2 ** failures)
+
+    def reset_connection(self):
+        """Cierra la conexión (quizá rota); Django abre otra en la siguiente consulta"""
+        try:
+            connection.close()
+        except Exception:
+            logger.warning('Could not close the database connection', exc_info=True)
+
+    def request_stop(self, signum, frame):
+        self.stdout.write(self.style.WARNING('Shutdown requested, finishing current batch...'))
+        self.stopping = True
+
+    def seconds_until_next_reminder(self, poll_interval):
+        """
+        Segundos hasta el próximo reminder_date o reintento del outbox futuro,
+        acotado por poll_interval
+        """
+        now = timezone.now()
+        next_date = VaccineReminder.objects.filter(
+            is_sent=False,
+            is_active=True,
+            reminder_date__gt=now
+        ).order_by('reminder_date').values_list('reminder_date', flat=True).first()
+        next_retry = NotificationOutbox.objects.filter(
+            status='pending',
+            next_attempt_at__gt=now
+        ).order_by('next_attempt_at').values_list('next_attempt_at', flat=True).first()
+
+        upcoming = [date for date in (next_date, next_retry) if date is not None]
+        if not upcoming:
+            return poll_interval
+        return max(0.0, min(poll_interval, (min(upcoming) - now).total_seconds()))
+
+    def listen(self):
+        """Suscribe la conexión a NOTIFY (PostgreSQL con psycopg2); False si no aplica"""
+        if connection.vendor != 'postgresql':
+            return False
+
+        connection.ensure_connection()
+        if not hasattr(connection.connection, 'poll'):
+            return False
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+        return True
+
+    def wait(self, timeout, listening):
+        """
+        Duerme hasta `timeout` segundos en tramos de 1s para atender SIGTERM a
+        tiempo; con LISTEN activo despierta apenas llega una notificación.
+        """
+        deadline = time.monotonic() + timeout
+        while not self.stopping:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+
+            if not listening:
+                time.sleep(min(1.0, remaining))
+                continue
+
+            pg_connection = connection.connection
+            ready, _, _ = select.select([pg_connection], [], [], min(1.0, remaining))
+            if ready:
+                pg_connection.poll()
+                if pg_connection.notifies:
+                    pg_connection.notifies.clear()
+                    logger.info('Woken up by new reminders')
+                    return
@@ -1,15 +1,43 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
 from django.core.management.base import BaseCommand
-from django.core.mail import send_mail
-from django.conf import settings
-from django.utils import timezone
-from core.models import VaccineReminder
+from core.models import NotificationOutbox, VaccineReminder
+from core.notifications import Notification, get_backend
 import logging
+import os
+import socket
+import threading
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
 
+class RateLimiter:
+    """Limita los envíos por segundo de cada proveedor; es seguro entre hilos"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+
+    def wait(self, provider):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(provider, now))
+            self.next_slot[provider] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
 class Command(BaseCommand):
     help = 'Send pending vaccine reminders'
+    # should_stop: callable que run_reminder_scheduler pasa por call_command para
+    # cortar entre bloques cuando recibe SIGTERM
+    stealth_options = ('should_stop',)
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -22,138 +50,298 @@ class Command(BaseCommand):
             action='store_true',
             help='Only send email reminders (skip SMS and push notifications)',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Reminders fetched per chunk and marked as sent per UPDATE (default: 500)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of backend batches sent in parallel per channel (default: 1, sequential)',
+        )
+        parser.add_argument(
+            '--rate-limit',
+            type=float,
+            default=0,
+            help='Maximum sends per second per provider (email, sms, push); 0 means unlimited',
+        )
+        parser.add_argument(
+            '--lease-seconds',
+            type=int,
+            default=600,
+            help='How long a claimed reminder stays reserved for this process (default: 600)',
+        )
+        parser.add_argument(
+            '--worker-id',
+            help='Identifier stored in claimed_by (default: host:pid:random)',
+        )
+        parser.add_argument(
+            '--digest',
+            action='store_true',
+            help=(
+                'Send one consolidated email per user with all of their due email reminders; '
+                'implies --email-only and --batch-size counts users'
+            ),
+        )
 
     def handle(self, *args, **options):
         dry_run = options['dry_run']
-        email_only = options['email_only']
+        digest = options['digest']
+        email_only = options['email_only'] or digest
+        batch_size = max(1, options['batch_size'])
+        self.concurrency = concurrency = max(1, options['concurrency'])
+        self.rate_limiter = RateLimiter(options['rate_limit'])
+        should_stop = options.get('should_stop') or (lambda: False)
         
         self.stdout.write(
             self.style.SUCCESS(f'Starting vaccine reminder check... (dry-run: {dry_run})')
         )
         
-        # Buscar recordatorios pendientes
-        pending_reminders = VaccineReminder.objects.filter(
-            is_sent=False,
-            is_active=True,
-            reminder_date__lte=timezone.now()
-        ).select_related('pet_vaccine', 'user', 'pet_vaccine__pet')
-        
-        if email_only:
-            pending_reminders = pending_reminders.filter(notification_method='email')
-        
-        total_reminders = pending_reminders.count()
-        self.stdout.write(f'Found {total_reminders} pending reminders')
+        notification_method = 'email' if email_only else None
+        if dry_run:
+            batches = self.read_batches(batch_size, notification_method, by_user=digest)
+        else:
+            worker_id = options['worker_id'] or f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+            batches = self.claim_batches(worker_id, batch_size, options['lease_seconds'], notification_method, by_user=digest)
+        process_batch = self.process_digest_batch if digest else self.process_batch
         
+        total_reminders = 0
         sent_count = 0
         failed_count = 0
+        self.dead_count = 0
         
-        for reminder in pending_reminders:
-            try:
-                if self.send_reminder(reminder, dry_run):
-                    sent_count += 1
-                    if not dry_run:
-                        reminder.mark_as_sent()
-                else:
-                    failed_count += 1
-                    
-            except Exception as e:
-                self.stdout.write(
-                    self.style.ERROR(f'Error processing reminder {reminder.id}: {str(e)}')
-                )
-                failed_count += 1
+        # Las lecturas y los UPDATE quedan en el hilo principal; solo los envíos van al pool
+        executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        try:
+            for batch in batches:
+                sent, failed = process_batch(batch, dry_run, executor)
+                sent_count, failed_count = sent_count + sent, failed_count + failed
+                total_reminders += len(batch)
+                # El bloque en curso ya quedó registrado; no se reserva el siguiente
+                if should_stop():
+                    self.stdout.write(self.style.WARNING('Stop requested, leaving remaining reminders for the next run'))
+                    break
+        finally:
+            if executor:
+                executor.shutdown()
         
         # Resultados
         self.stdout.write(
             self.style.SUCCESS(
                 f'Reminder processing complete:\n'
                 f'  - Sent: {sent_count}\n'
-                f'  - Failed: {failed_count}\n'
+                f'  - Failed: {failed_count} (dead-lettered: {self.dead_count})\n'
                 f'  - Total: {total_reminders}'
             )
         )
     
-    def send_reminder(self, reminder, dry_run=False):
-        """Send a single reminder"""
-        pet_name = reminder.pet_vaccine.pet.name
-        vaccine_name = reminder.pet_vaccine.vaccine_name
-        user_email = reminder.user.email
+    def read_batches(self, batch_size, notification_method=None, by_user=False):
+        """
+        Lee los recordatorios pendientes en bloques sin reservarlos (para --dry-run).
+        Con `by_user=True`, como claim_pending, cada bloque trae hasta batch_size
+        usuarios completos: nunca se corta un resumen entre dos bloques.
+        """
+        ordering = ('user_id', 'reminder_date', 'id') if by_user else ('reminder_date', 'id')
+        pending_reminders = VaccineReminder.deliverable().select_related(
+            'pet_vaccine', 'user', 'pet_vaccine__pet', 'user__profile'
+        ).order_by(*ordering)
+        if notification_method:
+            pending_reminders = pending_reminders.filter(notification_method=notification_method)
+        
+        batch = []
+        users = 0
+        for reminder in pending_reminders.iterator(chunk_size=batch_size):
+            if by_user:
+                # Solo se corta al empezar un usuario nuevo
+                if not batch or reminder.user_id != batch[-1].user_id:
+                    if users >= batch_size:
+                        yield batch
+                        batch = []
+                        users = 0
+                    users += 1
+            elif len(batch) >= batch_size:
+                yield batch
+                batch = []
+            batch.append(reminder)
+        if batch:
+            yield batch
+    
+    def claim_batches(self, worker_id, batch_size, lease_seconds, notification_method=None, by_user=False):
+        """
+        Reserva bloques con SKIP LOCKED hasta agotar los pendientes, para que
+        varios procesos puedan drenar la cola en paralelo sin envíos duplicados.
+        Los fallidos se liberan y vuelven según el backoff del outbox; si el
+        proceso muere, los reservados vuelven cuando vence el lease.
+        """
+        while True:
+            batch = VaccineReminder.claim_pending(
+                worker_id, batch_size, lease_seconds, notification_method, by_user=by_user
+            )
+            if not batch:
+                return
+            yield batch
+    
+    def process_batch(self, batch, dry_run, executor=None):
+        """
+        Construye una notificación por recordatorio, las entrega por bloques con
+        el backend de cada canal y registra el resultado del bloque.
+        """
+        notifications = [self.build_notification(reminder) for reminder in batch]
+        errors = self.deliver(notifications, dry_run, executor)
+        
+        return self.record_results(list(zip(batch, errors)), dry_run)
+    
+    def record_results(self, outcomes, dry_run):
+        """
+        Marca los enviados con un UPDATE y registra los fallos en el outbox
+        (un upsert por bloque) para reintentarlos con backoff.
+        """
+        sent_ids = [reminder.id for reminder, error in outcomes if error is None]
+        failures = [(reminder, error) for reminder, error in outcomes if error is not None]
+        if not dry_run:
+            VaccineReminder.mark_many_as_sent(sent_ids)
+            NotificationOutbox.record_successes([
+                reminder.id for reminder, error in outcomes
+                if error is None and getattr(reminder, 'outbox', None) is not None
+            ])
+            self.dead_count += NotificationOutbox.record_failures(failures)
+        
+        return len(sent_ids), len(failures)
+    
+    def process_digest_batch(self, batch, dry_run, executor=None):
+        """
+        Agrupa el bloque (ordenado por usuario) y envía un solo correo por
+        usuario; si el resumen sale, se marcan todos sus recordatorios.
+        """
+        groups = [list(reminders) for _, reminders in groupby(batch, key=lambda reminder: reminder.user_id)]
+        notifications = [self.build_digest_notification(reminders) for reminders in groups]
+        errors = self.deliver(notifications, dry_run, executor)
         
-        self.stdout.write(f'Processing: {vaccine_name} for {pet_name} -> {user_email}')
+        return self.record_results(
+            [(reminder, error) for reminders, error in zip(groups, errors) for reminder in reminders],
+            dry_run
+        )
+    
+    def deliver(self, notifications, dry_run, executor=None):
+        """
+        Entrega las notificaciones agrupadas por canal con send_batch() del
+        backend configurado; con executor, cada canal se reparte en
+        `concurrency` trozos en paralelo. Devuelve None o el error de cada
+        notificación, en el mismo orden.
+        """
+        errors = [None] * len(notifications)
+        for notification in notifications:
+            self.stdout.write(f'Processing: {notification.channel} -> {notification.recipient}')
         
         if dry_run:
-            self.stdout.write(self.style.WARNING('[DRY RUN] Would send reminder'))
-            return True
+            self.stdout.write(self.style.WARNING(f'[DRY RUN] Would send {len(notifications)} notifications'))
+            return errors
         
-        try:
-            if reminder.notification_method == 'email':
-                return self.send_email_reminder(reminder)
-            elif reminder.notification_method == 'sms':
-                return self.send_sms_reminder(reminder)
-            elif reminder.notification_method == 'push':
-                return self.send_push_reminder(reminder)
+        indexes_by_channel = defaultdict(list)
+        for index, notification in enumerate(notifications):
+            indexes_by_channel[notification.channel].append(index)
+        
+        jobs = []
+        for channel, indexes in indexes_by_channel.items():
+            backend = get_backend(channel)
+            chunk_size = -(-len(indexes) // (self.concurrency if executor else 1))
+            for start in range(0, len(indexes), chunk_size):
+                jobs.append((backend, indexes[start:start + chunk_size]))
+        
+        def send_chunk(job):
+            backend, indexes = job
+            return backend.send_batch(
+                [notifications[index] for index in indexes],
+                throttle=lambda: self.rate_limiter.wait(backend.channel)
+            )
+        
+        results = executor.map(send_chunk, jobs) if executor else map(send_chunk, jobs)
+        for (backend, indexes), chunk_errors in zip(jobs, results):
+            for index, error in zip(indexes, chunk_errors):
+                errors[index] = error
+        
+        for notification, error in zip(notifications, errors):
+            if error is None:
+                self.stdout.write(
+                    self.style.SUCCESS(f'✓ {notification.channel} sent to {notification.recipient}')
+                )
             else:
                 self.stdout.write(
-                    self.style.ERROR(f'Unknown notification method: {reminder.notification_method}')
+                    self.style.ERROR(f'✗ Failed to send {notification.channel} to {notification.recipient}: {error}')
                 )
-                return False
-                
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Failed to send reminder: {str(e)}'))
-            return False
+        return errors
     
-    def send_email_reminder(self, reminder):
-        """Send email reminder"""
-        subject = f'Recordatorio de Vacuna - {reminder.pet_vaccine.pet.name}'
+    def build_notification(self, reminder):
+        """Build the notification for a reminder on its own channel"""
+        pet_vaccine = reminder.pet_vaccine
+        next_dose_date = pet_vaccine.next_dose_date.strftime('%d/%m/%Y') if pet_vaccine.next_dose_date else 'Sin fecha'
         
-        # Usar mensaje personalizado o generar uno automático
-        if reminder.message:
-            message = reminder.message
-        else:
-            next_dose_date = reminder.pet_vaccine.next_dose_date.strftime('%d/%m/%Y')
-            message = f'''
+        if reminder.notification_method == 'email':
+            # Usar mensaje personalizado o generar uno automático
+            if reminder.message:
+                message = reminder.message
+            else:
+                message = f'''
 Hola,
 
-Este es un recordatorio de que {reminder.pet_vaccine.pet.name} necesita la vacuna "{reminder.pet_vaccine.vaccine_name}".
+Este es un recordatorio de que {pet_vaccine.pet.name} necesita la vacuna "{pet_vaccine.vaccine_name}".
 
 Fecha programada: {next_dose_date}
-Veterinario anterior: {reminder.pet_vaccine.veterinarian or 'No especificado'}
+Veterinario anterior: {pet_vaccine.veterinarian or 'No especificado'}
 
 Por favor, programa una cita con tu veterinario.
 
 Saludos,
 Equipo PetFans
-            '''.strip()
-        
-        try:
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[reminder.user.email],
-                fail_silently=False,
-            )
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'✓ Email sent to {reminder.user.email}')
+                '''.strip()
+            return Notification(
+                'email',
+                reminder.user.email,
+                message,
+                subject=f'Recordatorio de Vacuna - {pet_vaccine.pet.name}',
             )
-            return True
-            
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f'✗ Failed to send email: {str(e)}')
-            )
-            return False
-    
-    def send_sms_reminder(self, reminder):
-        """Send SMS reminder (placeholder - requires SMS service integration)"""
-        self.stdout.write(
-            self.style.WARNING('SMS reminders not implemented yet')
+        
+        message = reminder.message or f'PetFans: {pet_vaccine.pet.name} necesita la vacuna "{pet_vaccine.vaccine_name}" ({next_dose_date}).'
+        if reminder.notification_method == 'sms':
+            profile = getattr(reminder.user, 'profile', None)
+            return Notification('sms', profile.phone_number if profile else None, message)
+        # Push: el backend resuelve los dispositivos a partir del id de usuario
+        return Notification(
+            reminder.notification_method,
+            str(reminder.user_id),
+            message,
+            subject='Recordatorio de Vacuna',
         )
-        return False
     
-    def send_push_reminder(self, reminder):
-        """Send push notification (placeholder - requires push service integration)"""
-        self.stdout.write(
-            self.style.WARNING('Push notifications not implemented yet')
+    def build_digest_notification(self, reminders):
+        """Build a single email listing every due reminder of the user"""
+        lines = []
+        for reminder in reminders:
+            pet_vaccine = reminder.pet_vaccine
+            next_dose_date = pet_vaccine.next_dose_date.strftime('%d/%m/%Y') if pet_vaccine.next_dose_date else 'Sin fecha'
+            lines.append(f'- {pet_vaccine.pet.name}: "{pet_vaccine.vaccine_name}" ({next_dose_date})')
+        
+        pet_names = sorted({reminder.pet_vaccine.pet.name for reminder in reminders})
+        reminder_list = '\n'.join(lines)
+        message = f'''
+Hola,
+
+Estas son las vacunas pendientes de tus mascotas:
+
+{reminder_list}
+
+Por favor, programa una cita con tu veterinario.
+
+Saludos,
+Equipo PetFans
+        '''.strip()
+        
+        return Notification(
+            'email',
+            reminders[0].user.email,
+            message,
+            subject=f'Recordatorios de Vacunas - {", ".join(pet_names)}',
         )
-        return False
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-17 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_detect_orphaned_pets'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='pet',
+            options={'ordering': ['created_at', 'id'], 'verbose_name': 'Pet', 'verbose_name_plural': 'Pets'},
+        ),
+        migrations.AddIndex(
+            model_name='pet',
+            index=models.Index(fields=['created_at', 'id'], name='pet_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='petvaccine',
+            index=models.Index(fields=['pet', '-created_at', '-id'], name='petvaccine_pet_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='petweight',
+            index=models.Index(fields=['pet', '-date', '-created_at', '-id'], name='petweight_pet_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaccinereminder',
+            index=models.Index(fields=['reminder_date', 'id'], name='reminder_date_id_idx'),
+        ),
+    ]
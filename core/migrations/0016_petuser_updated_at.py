@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='petuser',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
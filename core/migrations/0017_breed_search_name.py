@@ -0,0 +1,58 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:06
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize(value):
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    without_accents = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(without_accents.lower().split())
+
+
+def fill_search_name(apps, schema_editor):
+    """Calcula search_name para las razas existentes"""
+    Breed = apps.get_model('core', 'Breed')
+    breeds = list(Breed.objects.all())
+    for breed in breeds:
+        breed.search_name = normalize(breed.name)
+    Breed.objects.bulk_update(breeds, ['search_name'], batch_size=500)
+
+
+def create_trigram_index(apps, schema_editor):
+    """Índice GIN de trigramas para búsquedas por palabra dentro del nombre (solo PostgreSQL)"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS breed_search_name_trgm_idx '
+        'ON core_breed USING gin (search_name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS breed_search_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_petuser_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='breed',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='breed',
+            index=models.Index(fields=['species', 'search_name'], name='breed_species_search_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_breed_search_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vaccinereminder',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Fecha de reserva'),
+        ),
+        migrations.AddField(
+            model_name='vaccinereminder',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=100, null=True, verbose_name='Reservado por'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+"""
+Trigger que envía NOTIFY vaccine_reminders cuando se insertan recordatorios o
+cambia su reminder_date, para despertar a run_reminder_scheduler. Al ser a nivel
+de sentencia también cubre bulk_create y UPDATE masivos. Solo PostgreSQL.
+"""
+from django.db import migrations
+
+
+def create_notify_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('''
+        CREATE OR REPLACE FUNCTION core_vaccinereminder_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('vaccine_reminders', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    ''')
+    schema_editor.execute('''
+        CREATE TRIGGER core_vaccinereminder_notify
+        AFTER INSERT OR UPDATE OF reminder_date, is_active ON core_vaccinereminder
+        FOR EACH STATEMENT EXECUTE FUNCTION core_vaccinereminder_notify()
+    ''')
+
+
+def drop_notify_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TRIGGER IF EXISTS core_vaccinereminder_notify ON core_vaccinereminder')
+    schema_editor.execute('DROP FUNCTION IF EXISTS core_vaccinereminder_notify()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_vaccinereminder_claim'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_notify_trigger, drop_notify_trigger),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_vaccinereminder_notify_trigger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vaccinereminder',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_sent', False)), fields=['reminder_date'], name='reminder_pending_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vaccinereminder',
+            index=models.Index(fields=['user', 'reminder_date'], name='reminder_user_date_idx'),
+        ),
+    ]
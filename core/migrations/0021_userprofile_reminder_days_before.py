@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_reminder_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='reminder_days_before',
+            field=models.JSONField(blank=True, default=list, verbose_name='Días de anticipación de recordatorios'),
+        ),
+    ]
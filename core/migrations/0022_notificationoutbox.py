@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_userprofile_reminder_days_before'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pendiente de reintento'), ('sent', 'Enviado'), ('dead', 'Descartado')], default='pending', max_length=10, verbose_name='Estado')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Intentos')),
+                ('next_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='Próximo intento')),
+                ('last_attempt_at', models.DateTimeField(blank=True, null=True, verbose_name='Último intento')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Último error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reminder', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='core.vaccinereminder')),
+            ],
+            options={
+                'verbose_name': 'Envío de Recordatorio',
+                'verbose_name_plural': 'Envíos de Recordatorios',
+                'indexes': [models.Index(condition=models.Q(('status', 'pending')), fields=['next_attempt_at'], name='outbox_pending_attempt_idx')],
+            },
+        ),
+    ]
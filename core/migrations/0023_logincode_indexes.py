@@ -0,0 +1,21 @@
+# Generated by Django 5.2.1 on 2026-10-17 03:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logincode',
+            index=models.Index(condition=models.Q(('used', False)), fields=['email', 'code', 'created_at'], name='logincode_verify_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logincode',
+            index=models.Index(fields=['created_at'], name='logincode_created_idx'),
+        ),
+    ]
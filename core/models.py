@@ -1,9 +1,13 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
+import random
 import uuid
 
+from .catalog import bump_catalog_version, normalize_search_text
+
 
 class Species(models.Model):
     name = models.CharField(max_length=255, unique=True)
@@ -15,19 +19,50 @@ class Species(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Tras el commit: si se invalida antes, otra petición puede recachear los datos viejos
+        transaction.on_commit(bump_catalog_version)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(bump_catalog_version)
+        return result
+
 
 class Breed(models.Model):
     name = models.CharField(max_length=255)
     species = models.ForeignKey(Species, on_delete=models.CASCADE, related_name='breeds')
+    # Nombre normalizado (minúsculas, sin tildes) para la búsqueda por prefijo
+    search_name = models.CharField(max_length=255, editable=False, default='')
 
     class Meta:
         verbose_name = "Breed"
         verbose_name_plural = "Breeds"
         unique_together = ['name', 'species']
+        indexes = [
+            models.Index(
+                fields=['species', 'search_name'],
+                name='breed_species_search_idx',
+                opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.species.name})"
 
+    def save(self, *args, **kwargs):
+        self.search_name = normalize_search_text(self.name)
+        if kwargs.get('update_fields') is not None and 'name' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'search_name'}
+        super().save(*args, **kwargs)
+        transaction.on_commit(bump_catalog_version)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(bump_catalog_version)
+        return result
+
 
 class Pet(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -48,6 +83,10 @@ class Pet(models.Model):
     class Meta:
         verbose_name = "Pet"
         verbose_name_plural = "Pets"
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='pet_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.species.name}"
@@ -82,6 +121,9 @@ class PetVaccine(models.Model):
         verbose_name = "Vacuna de Mascota"
         verbose_name_plural = "Vacunas de Mascotas"
         ordering = ['-applied_date', '-created_at']
+        indexes = [
+            models.Index(fields=['pet', '-created_at', '-id'], name='petvaccine_pet_created_idx'),
+        ]
 
     def __str__(self):
         status_display = self.get_status_display()
@@ -101,10 +143,28 @@ class PetVaccine(models.Model):
         self.applied_date = applied_date or timezone.now().date()
         self.save()
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Fecha cargada de la base, para detectar en save() si se reprogramó la dosis
+        instance._loaded_next_dose_date = getattr(instance, 'next_dose_date', None)
+        return instance
+    
     def save(self, *args, **kwargs):
-        """Override save para crear recordatorios automáticamente"""
+        """Override save para crear y reprogramar recordatorios automáticamente"""
         is_new = self.pk is None
-        super().save(*args, **kwargs)
+        # La vacuna y sus recordatorios (la cola de envíos) se escriben en la misma transacción
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.sync_reminders(is_new)
+    
+    def sync_reminders(self, is_new):
+        """Reprograma y crea los recordatorios automáticos tras guardar la vacuna"""
+        # Si cambió la próxima dosis, mover los recordatorios no enviados con un solo UPDATE
+        previous_next_dose_date = getattr(self, '_loaded_next_dose_date', self.next_dose_date)
+        if not is_new and self.next_dose_date and self.next_dose_date != previous_next_dose_date:
+            VaccineReminder.reschedule_unsent(self)
+        self._loaded_next_dose_date = self.next_dose_date
         
         # Crear recordatorios automáticos si hay fecha de próxima dosis
         if self.next_dose_date and self.status in ['pending', 'scheduled']:
@@ -113,6 +173,9 @@ class PetVaccine(models.Model):
 
 
 class LoginCode(models.Model):
+    # Tiempo durante el cual un código recién enviado se puede canjear
+    VALIDITY = timedelta(minutes=10)
+
     email = models.EmailField()
     code = models.CharField(max_length=6)
     used = models.BooleanField(default=False)
@@ -121,12 +184,40 @@ class LoginCode(models.Model):
     class Meta:
         verbose_name = "Login Code"
         verbose_name_plural = "Login Codes"
+        indexes = [
+            # Búsqueda de VerifyLoginCode: solo códigos sin usar
+            models.Index(
+                fields=['email', 'code', 'created_at'],
+                name='logincode_verify_idx',
+                condition=models.Q(used=False),
+            ),
+            # Purga de códigos vencidos (purge_login_codes)
+            models.Index(fields=['created_at'], name='logincode_created_idx'),
+        ]
 
     def is_valid(self):
-        return not self.used and self.created_at >= timezone.now() - timedelta(minutes=10)
+        return not self.used and self.created_at >= timezone.now() - self.VALIDITY
 
     def __str__(self):
         return f"Code for {self.email} ({'Used' if self.used else 'Unused'})"
+
+    @classmethod
+    def purgeable(cls):
+        """Códigos que ya no se pueden canjear: usados o vencidos"""
+        return cls.objects.filter(models.Q(used=True) | models.Q(created_at__lt=timezone.now() - cls.VALIDITY))
+
+    @classmethod
+    def purge_batch(cls, batch_size):
+        """
+        Borra hasta `batch_size` códigos purgables en una transacción corta, para
+        no mantener bloqueos largos sobre la tabla. Devuelve cuántos borró.
+        """
+        with transaction.atomic():
+            ids = list(cls.purgeable().order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return 0
+            deleted, _ = cls.objects.filter(id__in=ids).delete()
+        return deleted
     
 
 class UserProfile(models.Model):
@@ -136,6 +227,8 @@ class UserProfile(models.Model):
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
     is_premium = models.BooleanField(default=False)
     country = models.CharField(max_length=100, default='Chile')
+    # Días de anticipación de los recordatorios automáticos; vacío usa VACCINE_REMINDER_DAYS_BEFORE
+    reminder_days_before = models.JSONField(default=list, blank=True, verbose_name='Días de anticipación de recordatorios')
 
     def __str__(self):
         return self.full_name or self.user.username
@@ -164,6 +257,8 @@ class VaccineReminder(models.Model):
     sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de envío')
     is_active = models.BooleanField(default=True, verbose_name='Activo')
     message = models.TextField(blank=True, null=True, verbose_name='Mensaje personalizado')
+    claimed_by = models.CharField(max_length=100, blank=True, null=True, verbose_name='Reservado por')
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name='Fecha de reserva')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -172,6 +267,17 @@ class VaccineReminder(models.Model):
         verbose_name_plural = "Recordatorios de Vacunas"
         ordering = ['reminder_date', '-created_at']
         unique_together = ['pet_vaccine', 'user', 'reminder_type', 'days_before']
+        indexes = [
+            models.Index(fields=['reminder_date', 'id'], name='reminder_date_id_idx'),
+            # Búsqueda de pendientes del despachador: solo indexa lo que falta enviar
+            models.Index(
+                fields=['reminder_date'],
+                name='reminder_pending_date_idx',
+                condition=models.Q(is_sent=False, is_active=True),
+            ),
+            # Listado de VaccineReminderViewSet, siempre filtrado por usuario
+            models.Index(fields=['user', 'reminder_date'], name='reminder_user_date_idx'),
+        ]
 
     def __str__(self):
         vaccine_name = self.pet_vaccine.vaccine_name
@@ -189,6 +295,74 @@ class VaccineReminder(models.Model):
         self.is_sent = True
         self.sent_at = timezone.now()
         self.save()
+
+    @classmethod
+    def mark_many_as_sent(cls, reminder_ids):
+        """Marca varios recordatorios como enviados con un único UPDATE"""
+        if not reminder_ids:
+            return 0
+        now = timezone.now()
+        return cls.objects.filter(id__in=reminder_ids).update(is_sent=True, sent_at=now, updated_at=now)
+
+    @classmethod
+    def pending(cls):
+        """Recordatorios activos, no enviados y cuya fecha ya llegó"""
+        return cls.objects.filter(is_sent=False, is_active=True, reminder_date__lte=timezone.now())
+
+    @classmethod
+    def deliverable(cls):
+        """
+        Pendientes que se pueden intentar ahora: sin fallos previos o con su
+        reintento ya vencido en el outbox. Los enviados a dead-letter no salen.
+        """
+        return cls.pending().filter(
+            models.Q(outbox__isnull=True)
+            | models.Q(outbox__status='pending', outbox__next_attempt_at__lte=timezone.now())
+        )
+
+    @classmethod
+    def claim_pending(cls, worker_id, limit, lease_seconds=600, notification_method=None, by_user=False):
+        """
+        Reserva hasta `limit` recordatorios pendientes para `worker_id` y los
+        devuelve listos para enviar. Con `by_user=True` el límite es de usuarios:
+        se reservan todos los pendientes de hasta `limit` usuarios, ordenados por
+        usuario, para poder agruparlos en un resumen.
+
+        La selección usa SELECT ... FOR UPDATE SKIP LOCKED en una transacción
+        corta, así que varios procesos pueden reservar en paralelo sin pisarse.
+        La reserva es un lease: si el proceso muere o el envío falla, el
+        recordatorio vuelve a estar disponible cuando pasan `lease_seconds`.
+        """
+        now = timezone.now()
+        available = cls.deliverable().filter(
+            models.Q(claimed_at__isnull=True) | models.Q(claimed_at__lt=now - timedelta(seconds=lease_seconds))
+        )
+        if notification_method:
+            available = available.filter(notification_method=notification_method)
+        ordering = ('user_id', 'reminder_date', 'id') if by_user else ('reminder_date', 'id')
+
+        with transaction.atomic():
+            locked = available.select_for_update(skip_locked=True, of=('self',)).order_by(*ordering)
+            if by_user:
+                # Los usuarios salen de filas bloqueadas por este worker: si vinieran de una
+                # lectura sin lock, podrían ser justo los que tiene otro worker y la reserva
+                # quedaría vacía con otros usuarios aún pendientes
+                user_ids = []
+                for user_id in locked.values_list('user_id', flat=True).iterator(chunk_size=max(limit, 100)):
+                    if not user_ids or user_id != user_ids[-1]:
+                        if len(user_ids) >= limit:
+                            break
+                        user_ids.append(user_id)
+                claimed_ids = list(locked.filter(user_id__in=user_ids).values_list('id', flat=True))
+            else:
+                claimed_ids = list(locked.values_list('id', flat=True)[:limit])
+            cls.objects.filter(id__in=claimed_ids).update(claimed_by=worker_id, claimed_at=now)
+
+        return list(
+            cls.objects.filter(id__in=claimed_ids, claimed_by=worker_id)
+            .select_related('pet_vaccine', 'user', 'pet_vaccine__pet', 'user__profile', 'outbox')
+            .order_by(*ordering)
+        )
     
     def calculate_reminder_date(self):
         """Calcula la fecha del recordatorio basado en la próxima dosis"""
@@ -200,49 +374,68 @@ class VaccineReminder(models.Model):
             )
             self.save()
     
+    @classmethod
+    def reschedule_unsent(cls, pet_vaccine):
+        """
+        Recalcula reminder_date de todos los recordatorios no enviados de la
+        vacuna a partir de su days_before, con un único UPDATE en la base.
+        """
+        if not pet_vaccine.next_dose_date:
+            return 0
+        
+        next_dose_datetime = timezone.make_aware(
+            timezone.datetime.combine(pet_vaccine.next_dose_date, timezone.datetime.min.time())
+        )
+        offset = models.ExpressionWrapper(
+            models.F('days_before') * models.Value(timedelta(days=1)),
+            output_field=models.DurationField()
+        )
+        return cls.objects.filter(pet_vaccine=pet_vaccine, is_sent=False).update(
+            reminder_date=models.Value(next_dose_datetime, output_field=models.DateTimeField()) - offset,
+            updated_at=timezone.now(),
+        )
+    
     @classmethod
     def create_automatic_reminders(cls, pet_vaccine):
-        """Crea recordatorios automáticos para una vacuna"""
+        """
+        Crea los recordatorios automáticos de una vacuna para todos los dueños
+        con un único INSERT. Los días de anticipación salen del perfil de cada
+        usuario o, si no los configuró, de VACCINE_REMINDER_DAYS_BEFORE; los que
+        ya existen se ignoran gracias a unique_together.
+        """
         if not pet_vaccine.next_dose_date:
             return
         
-        # Crear recordatorios para todos los dueños de la mascota
-        for owner in pet_vaccine.pet.owners.all():
-            # Recordatorio 7 días antes
-            reminder_date_7 = pet_vaccine.next_dose_date - timedelta(days=7)
-            reminder_datetime_7 = timezone.make_aware(
-                timezone.datetime.combine(reminder_date_7, timezone.datetime.min.time())
-            )
-            
-            reminder_7, created = cls.objects.get_or_create(
-                pet_vaccine=pet_vaccine,
-                user=owner,
-                reminder_type='upcoming',
-                days_before=7,
-                defaults={
-                    'reminder_date': reminder_datetime_7,
-                    'notification_method': 'email',
-                    'message': f"Recordatorio: {pet_vaccine.vaccine_name} para {pet_vaccine.pet.name} vence pronto."
-                }
-            )
-            
-            # Recordatorio 1 día antes
-            reminder_date_1 = pet_vaccine.next_dose_date - timedelta(days=1)
-            reminder_datetime_1 = timezone.make_aware(
-                timezone.datetime.combine(reminder_date_1, timezone.datetime.min.time())
-            )
-            
-            reminder_1, created = cls.objects.get_or_create(
-                pet_vaccine=pet_vaccine,
-                user=owner,
-                reminder_type='upcoming',
-                days_before=1,
-                defaults={
-                    'reminder_date': reminder_datetime_1,
-                    'notification_method': 'email',
-                    'message': f"¡Urgente! {pet_vaccine.vaccine_name} para {pet_vaccine.pet.name} vence mañana."
-                }
-            )
+        pet = pet_vaccine.pet
+        owner_ids = list(PetUser.objects.filter(pet=pet).values_list('user_id', flat=True))
+        custom_days = dict(
+            UserProfile.objects.filter(user_id__in=owner_ids)
+            .exclude(reminder_days_before=[])
+            .values_list('user_id', 'reminder_days_before')
+        )
+        default_days = getattr(settings, 'VACCINE_REMINDER_DAYS_BEFORE', [7, 1])
+        
+        reminders = []
+        for owner_id in owner_ids:
+            for days_before in sorted(set(custom_days.get(owner_id) or default_days), reverse=True):
+                reminder_date = pet_vaccine.next_dose_date - timedelta(days=days_before)
+                if days_before == 1:
+                    message = f"¡Urgente! {pet_vaccine.vaccine_name} para {pet.name} vence mañana."
+                else:
+                    message = f"Recordatorio: {pet_vaccine.vaccine_name} para {pet.name} vence pronto."
+                reminders.append(cls(
+                    pet_vaccine=pet_vaccine,
+                    user_id=owner_id,
+                    reminder_type='upcoming',
+                    days_before=days_before,
+                    reminder_date=timezone.make_aware(
+                        timezone.datetime.combine(reminder_date, timezone.datetime.min.time())
+                    ),
+                    notification_method='email',
+                    message=message,
+                ))
+        
+        cls.objects.bulk_create(reminders, ignore_conflicts=True)
 
 
 class PetUser(models.Model):
@@ -256,6 +449,7 @@ class PetUser(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='pet_relationships')
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='owner')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ['pet', 'user']
@@ -265,6 +459,17 @@ class PetUser(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.pet.name} ({self.get_role_display()})"
 
+    @classmethod
+    def access_exists(cls, user, pet_ref='pk'):
+        """
+        Expresión EXISTS que indica si `user` tiene algún rol sobre la mascota
+        referenciada por `pet_ref` en la consulta externa. Evita el JOIN con
+        PetUser y el DISTINCT posterior sobre la fila completa.
+        """
+        return models.Exists(
+            cls.objects.filter(pet_id=models.OuterRef(pet_ref), user=user)
+        )
+
 
 class PetWeight(models.Model):
     pet = models.ForeignKey(Pet, on_delete=models.CASCADE, related_name='weights')
@@ -277,6 +482,102 @@ class PetWeight(models.Model):
         verbose_name = "Peso de Mascota"
         verbose_name_plural = "Pesos de Mascotas"
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['pet', '-date', '-created_at', '-id'], name='petweight_pet_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.pet.name} - {self.weight}kg ({self.date})"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Estado de entrega de un recordatorio que falló al menos una vez: intentos,
+    próximo reintento (backoff exponencial con jitter) y último error. Tras
+    REMINDER_MAX_ATTEMPTS fallos queda en dead-letter y el despachador lo ignora.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente de reintento'),
+        ('sent', 'Enviado'),
+        ('dead', 'Descartado'),
+    ]
+
+    reminder = models.OneToOneField(VaccineReminder, on_delete=models.CASCADE, related_name='outbox')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name='Estado')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Intentos')
+    next_attempt_at = models.DateTimeField(null=True, blank=True, verbose_name='Próximo intento')
+    last_attempt_at = models.DateTimeField(null=True, blank=True, verbose_name='Último intento')
+    last_error = models.TextField(blank=True, default='', verbose_name='Último error')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Envío de Recordatorio"
+        verbose_name_plural = "Envíos de Recordatorios"
+        indexes = [
+            # Próximo reintento para el scheduler: solo las entregas aún vivas
+            models.Index(
+                fields=['next_attempt_at'],
+                name='outbox_pending_attempt_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
 
     def __str__(self):
-        return f"{self.pet.name} - {self.weight}kg ({self.date})"
\ No newline at end of file
+        return f"{self.reminder_id} - {self.get_status_display()} ({self.attempts} intentos)"
+
+    @staticmethod
+    def backoff_seconds(attempts):
+        """Espera antes del siguiente intento: base * 2^(n-1), con tope y jitter del 50%"""
+        base = getattr(settings, 'REMINDER_RETRY_BASE_SECONDS', 60)
+        cap = getattr(settings, 'REMINDER_RETRY_MAX_SECONDS', 60 * 60)
+        delay = min(cap, base * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    @classmethod
+    def record_failures(cls, failures):
+        """
+        Registra un intento fallido por cada (recordatorio, error) con un único
+        upsert y libera la reserva para que el reintento dependa solo del backoff.
+        Devuelve cuántos pasaron a dead-letter.
+        """
+        if not failures:
+            return 0
+
+        now = timezone.now()
+        max_attempts = getattr(settings, 'REMINDER_MAX_ATTEMPTS', 5)
+        entries = []
+        for reminder, error in failures:
+            outbox = getattr(reminder, 'outbox', None) if reminder.pk else None
+            attempts = (outbox.attempts if outbox else 0) + 1
+            is_dead = attempts >= max_attempts
+            entries.append(cls(
+                reminder_id=reminder.pk,
+                status='dead' if is_dead else 'pending',
+                attempts=attempts,
+                next_attempt_at=None if is_dead else now + timedelta(seconds=cls.backoff_seconds(attempts)),
+                last_attempt_at=now,
+                last_error=str(error)[:1000],
+            ))
+
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                entries,
+                update_conflicts=True,
+                unique_fields=['reminder'],
+                update_fields=['status', 'attempts', 'next_attempt_at', 'last_attempt_at', 'last_error', 'updated_at'],
+            )
+            VaccineReminder.objects.filter(id__in=[entry.reminder_id for entry in entries]).update(
+                claimed_by=None, claimed_at=None
+            )
+        return sum(1 for entry in entries if entry.status == 'dead')
+
+    @classmethod
+    def record_successes(cls, reminder_ids):
+        """Cierra las entregas que tenían fallos previos y acabaron enviándose"""
+        if not reminder_ids:
+            return 0
+        now = timezone.now()
+        return cls.objects.filter(reminder_id__in=reminder_ids).update(
+            status='sent', next_attempt_at=None, last_attempt_at=now, updated_at=now
+        )
@@ -0,0 +1,179 @@
+"""
+Backends de entrega de notificaciones (email, SMS, push).
+
+Cada canal se resuelve con NOTIFICATION_BACKENDS en settings, que asocia el
+canal a la ruta de una clase backend. Todos los backends exponen send_batch(),
+que recibe un bloque de notificaciones y devuelve un error (o None) por cada
+una, de modo que el pipeline de recordatorios siempre entrega por bloques y un
+proveedor nuevo solo tiene que implementar send() o, si su API lo permite, un
+send_batch() nativo.
+"""
+import threading
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.module_loading import import_string
+
+DEFAULT_NOTIFICATION_BACKENDS = {
+    'email': 'core.notifications.EmailBackend',
+    'sms': 'core.notifications.UnavailableBackend',
+    'push': 'core.notifications.UnavailableBackend',
+}
+
+
+class Notification:
+    """Mensaje listo para entregar por un canal"""
+
+    def __init__(self, channel, recipient, body, subject=''):
+        self.channel = channel
+        self.recipient = recipient
+        self.body = body
+        self.subject = subject
+
+    def __repr__(self):
+        return f'<Notification {self.channel} -> {self.recipient}>'
+
+
+class BaseNotificationBackend:
+    """
+    Interfaz de los backends. Las subclases implementan send(), que lanza una
+    excepción si el proveedor rechaza el mensaje; send_batch() la reutiliza
+    salvo que el proveedor tenga un envío por lotes propio.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    def send(self, notification):
+        raise NotImplementedError
+
+    def send_batch(self, notifications, throttle=None):
+        """Entrega el bloque y devuelve una lista con None o el mensaje de error de cada notificación"""
+        errors = []
+        for notification in notifications:
+            try:
+                if throttle:
+                    throttle()
+                self.send(notification)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e) or e.__class__.__name__)
+        return errors
+
+
+class EmailBackend(BaseNotificationBackend):
+    """
+    Correo con el EMAIL_BACKEND de Django, reutilizando una sola conexión por
+    bloque. Si el backend de Django envía lotes atómicos (core.mailer con
+    Resend), el bloque sale en llamadas de hasta max_batch_size mensajes.
+    """
+
+    def send(self, notification):
+        errors = self.send_batch([notification])
+        if errors[0]:
+            raise RuntimeError(errors[0])
+
+    def build_message(self, notification, connection):
+        return EmailMessage(
+            subject=notification.subject,
+            body=notification.body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[notification.recipient],
+            connection=connection,
+        )
+
+    def send_batch(self, notifications, throttle=None):
+        errors = [None if notification.recipient else 'User has no email address' for notification in notifications]
+        connection = get_connection(fail_silently=False)
+        messages = [
+            (index, self.build_message(notification, connection))
+            for index, notification in enumerate(notifications)
+            if errors[index] is None
+        ]
+        connection.open()
+        try:
+            if not getattr(connection, 'atomic_batches', False):
+                self.send_one_by_one(messages, errors, throttle)
+                return errors
+
+            # Cada trozo es una sola llamada al proveedor, que lo acepta o rechaza completo.
+            # Solo un rechazo seguro (nada enviado) se reintenta uno a uno; ante cualquier
+            # otro error el trozo queda fallido y lo retoma el outbox con backoff
+            is_rejection = getattr(connection, 'is_rejection', None) or (lambda error: False)
+            chunk_size = getattr(connection, 'max_batch_size', None) or len(messages) or 1
+            for start in range(0, len(messages), chunk_size):
+                chunk = messages[start:start + chunk_size]
+                if len(chunk) == 1:
+                    self.send_one_by_one(chunk, errors, throttle)
+                    continue
+                for _ in chunk:
+                    if throttle:
+                        throttle()
+                try:
+                    connection.send_messages([message for _, message in chunk])
+                except Exception as e:
+                    if is_rejection(e):
+                        # El lote rechazado no indica qué mensaje falló: se envían uno a uno para aislarlo
+                        self.send_one_by_one(chunk, errors, is_rejection=is_rejection)
+                    else:
+                        # Timeout, corte o 5xx: el lote pudo entregarse, reenviarlo ahora lo duplicaría
+                        for index, _ in chunk:
+                            errors[index] = str(e) or e.__class__.__name__
+            return errors
+        finally:
+            connection.close()
+
+    def send_one_by_one(self, messages, errors, throttle=None, is_rejection=None):
+        """
+        Envía los mensajes de a uno. Con `is_rejection`, el primer error que no sea
+        un rechazo seguro corta el envío y deja el resto fallido para el outbox, en
+        lugar de encadenar un timeout por mensaje.
+        """
+        for position, (index, message) in enumerate(messages):
+            try:
+                if throttle:
+                    throttle()
+                message.send()
+            except Exception as e:
+                errors[index] = str(e) or e.__class__.__name__
+                if is_rejection and not is_rejection(e):
+                    for pending_index, _ in messages[position + 1:]:
+                        errors[pending_index] = errors[index]
+                    return
+
+
+class UnavailableBackend(BaseNotificationBackend):
+    """Canal sin proveedor configurado: todos los envíos fallan (y se reintentan vía outbox)"""
+
+    def send(self, notification):
+        raise RuntimeError(f'No {self.channel} provider configured')
+
+
+class FakeBackend(BaseNotificationBackend):
+    """
+    Backend en memoria para tests y benchmarks: guarda lo enviado en
+    FakeBackend.outbox y falla para los destinatarios en FakeBackend.failing.
+    """
+    outbox = []
+    failing = set()
+    lock = threading.Lock()
+
+    def send(self, notification):
+        if notification.recipient in self.failing:
+            raise ConnectionError(f'Fake {self.channel} provider rejected {notification.recipient}')
+        with self.lock:
+            FakeBackend.outbox.append(notification)
+
+    @classmethod
+    def reset(cls):
+        with cls.lock:
+            cls.outbox = []
+            cls.failing = set()
+
+
+def get_backend(channel):
+    """Instancia el backend configurado para el canal"""
+    backends = {**DEFAULT_NOTIFICATION_BACKENDS, **getattr(settings, 'NOTIFICATION_BACKENDS', {})}
+    if channel not in backends:
+        return UnavailableBackend(channel)
+    return import_string(backends[channel])(channel)
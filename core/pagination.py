@@ -0,0 +1,30 @@
+from rest_framework.pagination import CursorPagination
+
+
+class BaseCursorPagination(CursorPagination):
+    """
+    Paginación por cursor (keyset) sobre claves ordenadas e indexadas.
+
+    Cada ViewSet declara su pagination_class; el cliente puede pedir otro
+    tamaño de página con ?page_size=, acotado a max_page_size.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class PetCursorPagination(BaseCursorPagination):
+    ordering = ('created_at', 'id')
+
+
+class PetVaccineCursorPagination(BaseCursorPagination):
+    # applied_date admite NULL, por eso el cursor usa created_at
+    ordering = ('-created_at', '-id')
+
+
+class VaccineReminderCursorPagination(BaseCursorPagination):
+    ordering = ('reminder_date', 'id')
+
+
+class PetWeightCursorPagination(BaseCursorPagination):
+    ordering = ('-date', '-created_at', '-id')
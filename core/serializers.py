@@ -3,6 +3,38 @@ from .models import Species, Breed, Pet, UserProfile, PetVaccine, LoginCode, Vac
 from django.contrib.auth.models import User
 
 
+class SparseFieldsetMixin:
+    """
+    Permite elegir los campos de salida con los kwargs `fields` y `expand`.
+
+    Los campos listados en Meta.expandable_fields (relaciones anidadas) solo se
+    serializan si aparecen en `expand`; `expand=None` los incluye todos. Los
+    campos write_only nunca se quitan para no afectar la escritura.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            return
+
+        allowed = self.resolve_field_names(fields, expand)
+        for name in list(self.fields):
+            if name not in allowed and not self.fields[name].write_only:
+                self.fields.pop(name)
+
+    @classmethod
+    def resolve_field_names(cls, fields=None, expand=None):
+        """Devuelve el conjunto de campos de lectura que se van a renderizar"""
+        expandable = set(getattr(cls.Meta, 'expandable_fields', ()))
+        names = set(cls.Meta.fields)
+
+        if fields is not None:
+            names &= set(fields) | {'id'}
+        if expand is not None:
+            names = (names - expandable) | (expandable & set(expand))
+        return names
+
+
 class SpeciesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Species
@@ -70,7 +102,7 @@ class PetCollaboratorSerializer(serializers.ModelSerializer):
         return None
 
 
-class PetSerializer(serializers.ModelSerializer):
+class PetSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     current_age = serializers.ReadOnlyField()
     species = SpeciesSerializer(read_only=True)
     species_id = serializers.PrimaryKeyRelatedField(
@@ -101,6 +133,7 @@ class PetSerializer(serializers.ModelSerializer):
             'current_age', 'care_team', 'user_role', 'last_weight', 'is_active', 'created_at', 'updated_at', 'vaccines'
         ]
         read_only_fields = ['is_active', 'created_at', 'updated_at']
+        expandable_fields = ['vaccines', 'care_team']
 
     def get_image_url(self, obj):
         request = self.context.get('request')
@@ -109,11 +142,15 @@ class PetSerializer(serializers.ModelSerializer):
         return None
 
     def get_user_role(self, obj):
+        if hasattr(obj, 'caller_role'):
+            # Anotado por PetViewSet en la misma consulta
+            return obj.caller_role
+
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            relationship = obj.user_relationships.filter(user=request.user).first()
-            if relationship:
-                return relationship.role
+            for relationship in obj.user_relationships.all():
+                if relationship.user_id == request.user.id:
+                    return relationship.role
         return None
 
     def update(self, instance, validated_data):
@@ -122,6 +159,15 @@ class PetSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
     def get_last_weight(self, obj):
+        if hasattr(obj, 'last_weight_value'):
+            # Anotado por PetViewSet en la misma consulta
+            if obj.last_weight_value is None:
+                return None
+            return {
+                'weight': obj.last_weight_value,
+                'date': obj.last_weight_date
+            }
+
         last_weight = obj.weights.first()
         if last_weight:
             return {
@@ -131,6 +177,26 @@ class PetSerializer(serializers.ModelSerializer):
         return None
 
 
+class PetSummarySerializer(serializers.ModelSerializer):
+    """Resumen por mascota; los contadores vienen anotados por PetViewSet.summary"""
+    overdue_vaccines = serializers.IntegerField(read_only=True)
+    upcoming_vaccines = serializers.IntegerField(read_only=True)
+    next_reminder_date = serializers.DateTimeField(read_only=True)
+    last_weight = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Pet
+        fields = ['id', 'name', 'overdue_vaccines', 'upcoming_vaccines', 'next_reminder_date', 'last_weight']
+
+    def get_last_weight(self, obj):
+        if obj.last_weight_value is None:
+            return None
+        return {
+            'weight': obj.last_weight_value,
+            'date': obj.last_weight_date
+        }
+
+
 class LoginCodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = LoginCode
@@ -142,9 +208,14 @@ class UserProfileSerializer(serializers.ModelSerializer):
     email = serializers.ReadOnlyField(source='user.email')
     class Meta:
         model = UserProfile
-        fields = ['id', 'email', 'full_name', 'phone_number', 'avatar', 'is_premium', 'country']
+        fields = ['id', 'email', 'full_name', 'phone_number', 'avatar', 'is_premium', 'country', 'reminder_days_before']
         read_only_fields = ['is_premium']
 
+    def validate_reminder_days_before(self, value):
+        if not isinstance(value, list) or not all(type(days) is int and 0 <= days <= 365 for days in value):
+            raise serializers.ValidationError('Debe ser una lista de días entre 0 y 365.')
+        return sorted(set(value), reverse=True)
+
 
 class VaccineReminderSerializer(serializers.ModelSerializer):
     pet_name = serializers.CharField(source='pet_vaccine.pet.name', read_only=True)
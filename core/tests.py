@@ -1,15 +1,44 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, OperationalError, transaction
 from datetime import timedelta, date
 from decimal import Decimal
+from io import StringIO
+import os
+import re
+import signal
+import threading
+import time
 import uuid
+from unittest import mock, skipUnless
 
+import requests
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers
+from rest_framework.test import APIClient
+
+from .catalog import get_catalog_version
+from .management.commands.run_reminder_scheduler import Command as RunReminderSchedulerCommand
+from .management.commands.send_vaccine_reminders import Command as SendVaccineRemindersCommand
+from .management.commands.send_vaccine_reminders import RateLimiter
+from .emails import build_login_code_email
+from .throttling import AuthEmailThrottle, AuthIPThrottle
+from .email_queue import EmailQueue, get_email_queue, get_stats
+from .login_codes import CacheLoginCodeStore, ModelLoginCodeStore
+from .mailer import RESEND_BATCH_LIMIT, ResendClient, ResendError, get_client
+from .notifications import EmailBackend, FakeBackend, Notification, get_backend
 from .models import (
     Species, Breed, Pet, PetVaccine, LoginCode, 
-    UserProfile, VaccineReminder
+    UserProfile, VaccineReminder, PetUser, PetWeight, NotificationOutbox
 )
 
 
@@ -673,7 +702,7 @@ class VaccineReminderAutomaticCreationTest(TestCase):
         self.assertEqual(reminders.count(), 0)
     
     def test_create_automatic_reminders_get_or_create_behavior(self):
-        """Test de que get_or_create evita duplicados"""
+        """Test de que volver a guardar no crea recordatorios duplicados"""
         vaccine = PetVaccine.objects.create(
             pet=self.pet,
             vaccine_name="Vacuna Duplicada",
@@ -687,6 +716,87 @@ class VaccineReminderAutomaticCreationTest(TestCase):
         reminders = VaccineReminder.objects.filter(pet_vaccine=vaccine)
         self.assertEqual(reminders.count(), 2)  # No debería crear duplicados
 
+    def test_create_automatic_reminders_single_insert(self):
+        """Test de que los recordatorios de todos los dueños se insertan en un solo INSERT"""
+        for i in range(5):
+            self.pet.owners.add(User.objects.create_user(username=f'owner{i}', email=f'owner{i}@example.com'))
+        vaccine = PetVaccine.objects.create(pet=self.pet, vaccine_name="Vacuna Masiva", status='applied')
+        vaccine.status = 'pending'
+        vaccine.next_dose_date = date(2024, 1, 15)
+
+        with CaptureQueriesContext(connection) as context:
+            VaccineReminder.create_automatic_reminders(vaccine)
+
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(VaccineReminder.objects.filter(pet_vaccine=vaccine).count(), 12)
+
+    def test_changed_next_dose_date_reschedules_unsent_reminders(self):
+        """Test de que mover la próxima dosis reprograma los recordatorios no enviados"""
+        vaccine = PetVaccine.objects.create(
+            pet=self.pet,
+            vaccine_name="Vacuna Reprogramada",
+            status='pending',
+            next_dose_date=date(2024, 1, 15)
+        )
+        sent = VaccineReminder.objects.get(pet_vaccine=vaccine, days_before=7)
+        sent.mark_as_sent()
+
+        vaccine = PetVaccine.objects.get(pk=vaccine.pk)
+        vaccine.next_dose_date = date(2024, 2, 10)
+        with CaptureQueriesContext(connection) as context:
+            vaccine.save()
+
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE "core_vaccinereminder"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            VaccineReminder.objects.get(pet_vaccine=vaccine, days_before=1).reminder_date,
+            timezone.make_aware(timezone.datetime(2024, 2, 9))
+        )
+        self.assertEqual(
+            VaccineReminder.objects.get(pk=sent.pk).reminder_date,
+            timezone.make_aware(timezone.datetime(2024, 1, 8))
+        )
+
+    def test_unchanged_next_dose_date_does_not_reschedule(self):
+        """Test de que guardar sin cambiar la fecha no actualiza recordatorios"""
+        vaccine = PetVaccine.objects.create(
+            pet=self.pet,
+            vaccine_name="Vacuna Sin Cambios",
+            status='pending',
+            next_dose_date=date(2024, 1, 15)
+        )
+        vaccine = PetVaccine.objects.get(pk=vaccine.pk)
+        vaccine.notes = "Sin cambios de fecha"
+        with CaptureQueriesContext(connection) as context:
+            vaccine.save()
+
+        self.assertFalse(any(
+            query['sql'].startswith('UPDATE "core_vaccinereminder"') for query in context.captured_queries
+        ))
+
+    @override_settings(VACCINE_REMINDER_DAYS_BEFORE=[14, 3])
+    def test_create_automatic_reminders_configurable_offsets(self):
+        """Test de que los días salen de settings o del perfil de cada usuario"""
+        user2 = User.objects.create_user(username='testuser2', email='test2@example.com')
+        UserProfile.objects.create(user=user2, full_name='Otro', reminder_days_before=[30, 7, 0])
+        self.pet.owners.add(user2)
+
+        vaccine = PetVaccine.objects.create(
+            pet=self.pet,
+            vaccine_name="Vacuna Configurable",
+            status='pending',
+            next_dose_date=date(2024, 1, 15)
+        )
+
+        reminders = VaccineReminder.objects.filter(pet_vaccine=vaccine)
+        self.assertEqual(set(reminders.filter(user=self.user).values_list('days_before', flat=True)), {14, 3})
+        self.assertEqual(set(reminders.filter(user=user2).values_list('days_before', flat=True)), {30, 7, 0})
+        self.assertEqual(
+            reminders.get(user=self.user, days_before=14).reminder_date.date(),
+            date(2024, 1, 1)
+        )
+
 
 class ModelIntegrationTest(TestCase):
     """Tests de integración entre modelos"""
@@ -761,3 +871,1248 @@ class ModelIntegrationTest(TestCase):
         # Ahora debería poder eliminar la especie
         self.species.delete()
         self.assertEqual(Species.objects.count(), 0)
+
+
+class PetViewSetQueryTest(TestCase):
+    """Tests del número de consultas del listado de mascotas"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com')
+        UserProfile.objects.create(user=self.user, full_name='Owner', is_premium=True)
+        self.species = Species.objects.create(name="Perro")
+        self.breed = Breed.objects.create(name="Beagle", species=self.species)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_pets(self, count):
+        start = Pet.objects.count()
+        for i in range(start, start + count):
+            pet = Pet.objects.create(name=f"Pet {i}", species=self.species, breed=self.breed)
+            PetUser.objects.create(pet=pet, user=self.user, role='owner')
+            collaborator = User.objects.create_user(username=f'collab{i}', email=f'collab{i}@example.com')
+            UserProfile.objects.create(user=collaborator, full_name=f'Collab {i}')
+            PetUser.objects.create(pet=pet, user=collaborator, role='viewer')
+            PetVaccine.objects.create(pet=pet, vaccine_name="Rabia", status='applied')
+            PetWeight.objects.create(pet=pet, weight=Decimal('10.50'), date=date(2024, 1, 1))
+            PetWeight.objects.create(pet=pet, weight=Decimal('12.00'), date=date(2024, 6, 1))
+
+    def count_list_queries(self, url='/api/pets/?expand=vaccines,care_team'):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_list_query_count_is_constant(self):
+        """Test de que el listado no crece en consultas con la cantidad de mascotas"""
+        self.create_pets(2)
+        queries_small, _ = self.count_list_queries()
+
+        self.create_pets(6)
+        queries_large, response = self.count_list_queries()
+
+        self.assertEqual(queries_small, queries_large)
+        self.assertEqual(len(response.data['results']), 8)
+
+    def test_list_reads_prefetched_values(self):
+        """Test de que user_role, last_weight y care_team salen de los datos precargados"""
+        self.create_pets(1)
+        _, response = self.count_list_queries()
+
+        pet_data = response.data['results'][0]
+        self.assertEqual(pet_data['user_role'], 'owner')
+        self.assertEqual(pet_data['last_weight']['weight'], Decimal('12.00'))
+        self.assertEqual(pet_data['breed']['species']['name'], "Perro")
+        self.assertEqual(len(pet_data['care_team']), 2)
+        self.assertEqual(len(pet_data['vaccines']), 1)
+
+    def test_list_does_not_expand_nested_relations_by_default(self):
+        """Test de que el listado omite vaccines y care_team si no se piden"""
+        self.create_pets(3)
+        queries_expanded, _ = self.count_list_queries()
+        queries_default, response = self.count_list_queries('/api/pets/')
+
+        pet_data = response.data['results'][0]
+        self.assertNotIn('vaccines', pet_data)
+        self.assertNotIn('care_team', pet_data)
+        self.assertEqual(pet_data['user_role'], 'owner')
+        self.assertLess(queries_default, queries_expanded)
+
+    def test_user_role_and_last_weight_are_annotated(self):
+        """Test de que user_role y last_weight no agregan consultas por mascota"""
+        self.create_pets(3)
+        queries_with, _ = self.count_list_queries('/api/pets/?fields=name,user_role,last_weight')
+        queries_without, response = self.count_list_queries('/api/pets/?fields=name')
+
+        self.assertEqual(queries_with, queries_without)
+        self.assertNotIn('last_weight', response.data['results'][0])
+
+    def test_last_weight_is_none_without_weights(self):
+        """Test de que last_weight es None si la mascota no tiene pesos"""
+        self.create_pets(1)
+        PetWeight.objects.all().delete()
+        _, response = self.count_list_queries('/api/pets/?fields=last_weight')
+
+        self.assertIsNone(response.data['results'][0]['last_weight'])
+
+    def test_list_sparse_fieldset(self):
+        """Test de que ?fields= limita los campos devueltos"""
+        self.create_pets(1)
+        _, response = self.count_list_queries('/api/pets/?fields=name,photo,species&expand=vaccines')
+
+        pet_data = response.data['results'][0]
+        self.assertEqual(set(pet_data), {'id', 'name', 'photo', 'species', 'vaccines'})
+
+    def test_retrieve_expands_nested_relations_by_default(self):
+        """Test de que el detalle mantiene vaccines y care_team"""
+        self.create_pets(1)
+        pet = Pet.objects.get()
+        response = self.client.get(f'/api/pets/{pet.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('vaccines', response.data)
+        self.assertEqual(len(response.data['care_team']), 2)
+
+
+class CursorPaginationTest(TestCase):
+    """Tests de la paginación por cursor de los endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com')
+        UserProfile.objects.create(user=self.user, full_name='Owner', is_premium=True)
+        self.species = Species.objects.create(name="Perro")
+        self.pet = Pet.objects.create(name="Buddy", species=self.species)
+        PetUser.objects.create(pet=self.pet, user=self.user, role='owner')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def collect_pages(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_weights_are_paginated_without_gaps_or_duplicates(self):
+        """Test de que recorrer las páginas de pesos devuelve cada registro una vez"""
+        for day in range(1, 8):
+            PetWeight.objects.create(pet=self.pet, weight=Decimal('10.00'), date=date(2024, 1, day))
+            # Registros con la misma fecha fuerzan el desempate por created_at e id
+            PetWeight.objects.create(pet=self.pet, weight=Decimal('11.00'), date=date(2024, 1, day))
+
+        ids = self.collect_pages(f'/api/weights/?pet={self.pet.id}&page_size=3')
+
+        expected = list(PetWeight.objects.filter(pet=self.pet).order_by('-date', '-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_reminders_are_paginated_by_reminder_date(self):
+        """Test de que los recordatorios se paginan en orden de reminder_date"""
+        vaccine = PetVaccine.objects.create(pet=self.pet, vaccine_name="Rabia", status='applied')
+        for days_before in range(5):
+            VaccineReminder.objects.create(
+                pet_vaccine=vaccine,
+                user=self.user,
+                reminder_type='upcoming',
+                reminder_date=timezone.now() + timedelta(days=days_before),
+                days_before=days_before,
+            )
+
+        ids = self.collect_pages('/api/vaccine-reminders/?page_size=2')
+
+        expected = list(VaccineReminder.objects.order_by('reminder_date', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+
+class PetAccessFilterTest(TestCase):
+    """Tests del filtro de acceso basado en EXISTS"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com')
+        self.other = User.objects.create_user(username='other', email='other@example.com')
+        self.species = Species.objects.create(name="Perro")
+        self.shared_pet = Pet.objects.create(name="Shared", species=self.species)
+        self.other_pet = Pet.objects.create(name="Other", species=self.species)
+        PetUser.objects.create(pet=self.shared_pet, user=self.user, role='owner')
+        PetUser.objects.create(pet=self.shared_pet, user=self.other, role='viewer')
+        PetUser.objects.create(pet=self.other_pet, user=self.other, role='owner')
+
+    def test_access_exists_returns_each_pet_once(self):
+        """Test de que una mascota compartida aparece una sola vez sin DISTINCT"""
+        pets = Pet.objects.filter(PetUser.access_exists(self.user))
+        self.assertEqual(list(pets), [self.shared_pet])
+
+        pets = Pet.objects.filter(PetUser.access_exists(self.other))
+        self.assertEqual(set(pets), {self.shared_pet, self.other_pet})
+
+    def test_access_exists_through_relations(self):
+        """Test de que el filtro sirve para modelos relacionados con la mascota"""
+        PetVaccine.objects.create(pet=self.shared_pet, vaccine_name="Rabia")
+        PetVaccine.objects.create(pet=self.other_pet, vaccine_name="Triple")
+
+        vaccines = PetVaccine.objects.filter(PetUser.access_exists(self.user, pet_ref='pet'))
+        self.assertEqual([v.vaccine_name for v in vaccines], ["Rabia"])
+
+
+class PetConditionalGetTest(TestCase):
+    """Tests de GET condicional (ETag) en /api/pets/"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com')
+        UserProfile.objects.create(user=self.user, full_name='Owner', is_premium=True)
+        self.species = Species.objects.create(name="Perro")
+        self.pet = Pet.objects.create(name="Buddy", species=self.species)
+        PetUser.objects.create(pet=self.pet, user=self.user, role='owner')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_returns_304_when_nothing_changed(self):
+        """Test de que un ETag vigente devuelve 304 sin cuerpo"""
+        response = self.client.get('/api/pets/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+
+        response = self.client.get('/api/pets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_changes_when_related_data_changes(self):
+        """Test de que agregar un peso o borrar una vacuna invalida el ETag"""
+        etag = self.client.get('/api/pets/')['ETag']
+
+        PetWeight.objects.create(pet=self.pet, weight=Decimal('8.00'))
+        response = self.client.get('/api/pets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        vaccine = PetVaccine.objects.create(pet=self.pet, vaccine_name="Rabia")
+        etag = self.client.get('/api/pets/')['ETag']
+        vaccine.delete()
+        response = self.client.get('/api/pets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_depends_on_query_params(self):
+        """Test de que ?expand= produce un ETag distinto"""
+        etag = self.client.get('/api/pets/')['ETag']
+        response = self.client.get('/api/pets/?expand=vaccines', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_returns_304(self):
+        """Test de GET condicional en el detalle"""
+        url = f'/api/pets/{self.pet.id}/'
+        etag = self.client.get(url)['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_invalid_pk_returns_404(self):
+        """Test de que un pk que no es UUID sigue respondiendo 404"""
+        response = self.client.get('/api/pets/not-a-uuid/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_etag_changes_when_care_team_profile_changes(self):
+        """Test de que renombrar a un colaborador invalida el ETag"""
+        collaborator = User.objects.create_user(username='vet', email='vet@example.com')
+        profile = UserProfile.objects.create(user=collaborator, full_name='Vet')
+        PetUser.objects.create(pet=self.pet, user=collaborator, role='viewer')
+        etag = self.client.get('/api/pets/')['ETag']
+
+        profile.full_name = 'Dra. Vet'
+        profile.save()
+        response = self.client.get('/api/pets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_when_catalog_changes(self):
+        """Test de que renombrar la especie invalida el ETag"""
+        etag = self.client.get('/api/pets/')['ETag']
+
+        self.species.name = 'Canino'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.species.save()
+        response = self.client.get('/api/pets/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_alone_is_ignored(self):
+        """Test de que If-Modified-Since sin ETag no produce 304 (no ve borrados)"""
+        response = self.client.get('/api/pets/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+
+class PetSummaryTest(TestCase):
+    """Tests del endpoint /api/pets/summary/"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', email='owner@example.com')
+        UserProfile.objects.create(user=self.user, full_name='Owner', is_premium=True)
+        self.species = Species.objects.create(name="Perro")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_pet(self, name):
+        pet = Pet.objects.create(name=name, species=self.species)
+        PetUser.objects.create(pet=pet, user=self.user, role='owner')
+        today = timezone.now().date()
+        PetVaccine.objects.create(pet=pet, vaccine_name="Vencida", status='pending', next_dose_date=today - timedelta(days=3))
+        PetVaccine.objects.create(pet=pet, vaccine_name="Próxima", status='scheduled', next_dose_date=today + timedelta(days=10))
+        PetVaccine.objects.create(pet=pet, vaccine_name="Aplicada", status='applied', next_dose_date=today - timedelta(days=3))
+        PetWeight.objects.create(pet=pet, weight=Decimal('9.50'), date=date(2024, 5, 1))
+        return pet
+
+    def test_summary_counts(self):
+        """Test de contadores, próximo recordatorio y último peso"""
+        pet = self.create_pet("Buddy")
+        response = self.client.get('/api/pets/summary/')
+
+        self.assertEqual(response.status_code, 200)
+        summary = response.data[0]
+        self.assertEqual(summary['id'], str(pet.id))
+        self.assertEqual(summary['overdue_vaccines'], 1)
+        self.assertEqual(summary['upcoming_vaccines'], 1)
+        self.assertEqual(summary['last_weight']['weight'], Decimal('9.50'))
+
+        expected_reminder = VaccineReminder.objects.filter(
+            user=self.user, is_sent=False, is_active=True
+        ).order_by('reminder_date').first()
+        self.assertIsNotNone(summary['next_reminder_date'])
+        self.assertEqual(
+            summary['next_reminder_date'],
+            serializers.DateTimeField().to_representation(expected_reminder.reminder_date)
+        )
+
+    def test_summary_query_count_is_constant(self):
+        """Test de que el resumen no hace consultas por mascota"""
+        self.create_pet("Buddy")
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/api/pets/summary/')
+
+        for i in range(4):
+            self.create_pet(f"Pet {i}")
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/api/pets/summary/')
+
+        self.assertEqual(len(response.data), 5)
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+        self.assertEqual(len(large.captured_queries), 1)
+
+
+class CatalogCacheTest(TestCase):
+    """Tests de la caché versionada del catálogo de especies y razas"""
+
+    def setUp(self):
+        cache.clear()
+        self.species = Species.objects.create(name="Perro")
+        Breed.objects.create(name="Beagle", species=self.species)
+        self.client = APIClient()
+
+    def test_list_is_served_from_cache(self):
+        """Test de que el segundo listado no consulta la base de datos"""
+        response = self.client.get('/api/breeds/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('max-age', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/breeds/')
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(response.data[0]['species']['name'], "Perro")
+
+    def test_catalog_changes_bump_version(self):
+        """Test de que crear una raza invalida el ETag y el catálogo cacheado"""
+        etag = self.client.get('/api/breeds/')['ETag']
+        self.assertEqual(self.client.get('/api/breeds/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Breed.objects.create(name="Boxer", species=self.species)
+        response = self.client.get('/api/breeds/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+
+    def test_delete_bumps_version(self):
+        """Test de que borrar una especie invalida el catálogo"""
+        other = Species.objects.create(name="Gato")
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertNotEqual(get_catalog_version(), version)
+
+    def test_version_bumps_only_after_commit(self):
+        """Test de que la versión solo cambia cuando se ejecuta el on_commit"""
+        version = get_catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            Breed.objects.create(name="Boxer", species=self.species)
+            self.assertEqual(get_catalog_version(), version)
+        self.assertEqual(get_catalog_version(), version)
+
+        callbacks[0]()
+        self.assertNotEqual(get_catalog_version(), version)
+
+
+class BreedSearchTest(TestCase):
+    """Tests de la búsqueda de razas por prefijo"""
+
+    def setUp(self):
+        cache.clear()
+        self.dog = Species.objects.create(name="Perro")
+        self.cat = Species.objects.create(name="Gato")
+        for name in ["Bichón Frisé", "Bichón Maltés", "Beagle", "Boxer"]:
+            Breed.objects.create(name=name, species=self.dog)
+        Breed.objects.create(name="Bengalí", species=self.cat)
+        self.client = APIClient()
+
+    def search(self, params):
+        response = self.client.get('/api/breeds/', params)
+        self.assertEqual(response.status_code, 200)
+        return [breed['name'] for breed in response.data]
+
+    def test_search_name_is_normalized(self):
+        """Test de que search_name se guarda sin tildes ni mayúsculas"""
+        breed = Breed.objects.get(name="Bichón Frisé")
+        self.assertEqual(breed.search_name, "bichon frise")
+
+    def test_accent_insensitive_prefix(self):
+        """Test de que "bichon" encuentra las razas con tilde"""
+        names = self.search({'species': self.dog.id, 'q': 'bichon'})
+        self.assertEqual(names, ["Bichón Frisé", "Bichón Maltés"])
+
+    def test_word_prefix_match(self):
+        """Test de coincidencia por prefijo de una palabra interna"""
+        names = self.search({'q': 'FRIS'})
+        self.assertEqual(names, ["Bichón Frisé"])
+
+    def test_species_filter_and_limit(self):
+        """Test del filtro por especie y del límite de resultados"""
+        self.assertEqual(self.search({'species': self.cat.id, 'q': 'be'}), ["Bengalí"])
+        self.assertEqual(len(self.search({'species': self.dog.id, 'limit': 2})), 2)
+
+
+class SendVaccineRemindersCommandTest(TestCase):
+    """Tests del comando send_vaccine_reminders"""
+
+    def setUp(self):
+        self.species = Species.objects.create(name="Perro")
+        self.pet = Pet.objects.create(name="Buddy", species=self.species)
+
+    def create_due_reminders(self, count):
+        start = VaccineReminder.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com')
+            vaccine = PetVaccine.objects.create(pet=self.pet, vaccine_name=f"Vacuna {i}", status='applied')
+            VaccineReminder.objects.create(
+                pet_vaccine=vaccine,
+                user=user,
+                reminder_type='upcoming',
+                reminder_date=timezone.now() - timedelta(hours=1),
+                days_before=7,
+                message="Recordatorio",
+            )
+
+    def run_command(self, *args):
+        call_command('send_vaccine_reminders', *args, stdout=StringIO())
+
+    def test_marks_sent_reminders_in_batches(self):
+        """Test de que todos los recordatorios enviados quedan marcados"""
+        self.create_due_reminders(5)
+        self.run_command('--batch-size', '2')
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertFalse(VaccineReminder.objects.filter(is_sent=False).exists())
+        self.assertFalse(VaccineReminder.objects.filter(sent_at__isnull=True).exists())
+
+    def test_query_count_does_not_grow_per_reminder(self):
+        """Test de que las consultas crecen por bloque y no por recordatorio"""
+        self.create_due_reminders(2)
+        with CaptureQueriesContext(connection) as small:
+            self.run_command('--batch-size', '50')
+
+        self.create_due_reminders(20)
+        with CaptureQueriesContext(connection) as large:
+            self.run_command('--batch-size', '50')
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_claimed_reminders_are_skipped_by_other_workers(self):
+        """Test de que un recordatorio reservado por otro proceso no se envía"""
+        self.create_due_reminders(3)
+        claimed = VaccineReminder.claim_pending('other-worker', limit=1)
+        self.assertEqual(len(claimed), 1)
+
+        self.run_command('--worker-id', 'this-worker')
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(VaccineReminder.objects.get(id=claimed[0].id).is_sent)
+        self.assertEqual(
+            set(VaccineReminder.objects.filter(is_sent=True).values_list('claimed_by', flat=True)),
+            {'this-worker'}
+        )
+
+    def test_expired_lease_can_be_claimed_again(self):
+        """Test de que un lease vencido vuelve a estar disponible"""
+        self.create_due_reminders(1)
+        VaccineReminder.claim_pending('crashed-worker', limit=1)
+        VaccineReminder.objects.update(claimed_at=timezone.now() - timedelta(hours=1))
+
+        claimed = VaccineReminder.claim_pending('new-worker', limit=10, lease_seconds=600)
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(claimed[0].claimed_by, 'new-worker')
+
+    def test_concurrent_delivery(self):
+        """Test de que --concurrency envía y marca todos los recordatorios"""
+        self.create_due_reminders(6)
+        self.run_command('--concurrency', '3', '--batch-size', '4')
+
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertFalse(VaccineReminder.objects.filter(is_sent=False).exists())
+
+    def test_rate_limiter_spaces_sends_per_provider(self):
+        """Test de que el limitador separa los envíos de un mismo proveedor"""
+        limiter = RateLimiter(rate=50)
+        start = time.monotonic()
+        for _ in range(3):
+            limiter.wait('email')
+        limiter.wait('sms')
+        self.assertGreaterEqual(time.monotonic() - start, 0.04)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_failed_send_is_scheduled_for_retry(self):
+        """Test de que un envío fallido queda en el outbox con backoff y no se reintenta antes de tiempo"""
+        self.create_due_reminders(2)
+        with mock.patch.object(EmailBackend, 'send_batch', side_effect=lambda notifications, throttle=None: ['Provider down'] * len(notifications)):
+            self.run_command()
+
+        outbox = NotificationOutbox.objects.all()
+        self.assertEqual(outbox.count(), 2)
+        for entry in outbox:
+            self.assertEqual(entry.status, 'pending')
+            self.assertEqual(entry.attempts, 1)
+            self.assertEqual(entry.last_error, 'Provider down')
+            self.assertGreater(entry.next_attempt_at, timezone.now())
+        self.assertFalse(VaccineReminder.objects.filter(claimed_at__isnull=False).exists())
+
+        # Antes del próximo intento el despachador no los toma
+        self.run_command()
+        self.assertEqual(len(mail.outbox), 0)
+
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.run_command()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(VaccineReminder.objects.filter(is_sent=False).exists())
+        self.assertEqual(set(NotificationOutbox.objects.values_list('status', flat=True)), {'sent'})
+
+    @override_settings(REMINDER_MAX_ATTEMPTS=2)
+    def test_repeated_failures_are_dead_lettered(self):
+        """Test de que tras REMINDER_MAX_ATTEMPTS fallos el recordatorio pasa a dead-letter"""
+        self.create_due_reminders(1)
+        with mock.patch.object(EmailBackend, 'send_batch', side_effect=lambda notifications, throttle=None: ['Provider down'] * len(notifications)):
+            self.run_command()
+            NotificationOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+            self.run_command()
+
+        entry = NotificationOutbox.objects.get()
+        self.assertEqual(entry.status, 'dead')
+        self.assertEqual(entry.attempts, 2)
+        self.assertIsNone(entry.next_attempt_at)
+        self.assertFalse(VaccineReminder.deliverable().exists())
+
+    def test_backoff_grows_exponentially_with_jitter(self):
+        """Test de que la espera se duplica por intento, con jitter y tope"""
+        with override_settings(REMINDER_RETRY_BASE_SECONDS=10, REMINDER_RETRY_MAX_SECONDS=100):
+            for attempts, delay in [(1, 10), (2, 20), (3, 40), (10, 100)]:
+                backoff = NotificationOutbox.backoff_seconds(attempts)
+                self.assertGreaterEqual(backoff, delay / 2)
+                self.assertLessEqual(backoff, delay)
+
+    @override_settings(NOTIFICATION_BACKENDS={'email': 'core.notifications.FakeBackend', 'sms': 'core.notifications.FakeBackend'})
+    def test_channels_are_delivered_in_batches_through_backends(self):
+        """Test de que cada canal se entrega con un solo send_batch por bloque"""
+        FakeBackend.reset()
+        self.addCleanup(FakeBackend.reset)
+        self.create_due_reminders(4)
+        sms_reminders = VaccineReminder.objects.order_by('id')[:2]
+        VaccineReminder.objects.filter(id__in=[reminder.id for reminder in sms_reminders]).update(notification_method='sms')
+        for i, reminder in enumerate(sms_reminders):
+            UserProfile.objects.create(user=reminder.user, full_name=f'Dueño {i}', phone_number=f'+5690000000{i}')
+
+        original = FakeBackend.send_batch
+        with mock.patch.object(FakeBackend, 'send_batch', autospec=True, side_effect=original) as send_batch:
+            self.run_command('--batch-size', '10')
+
+        self.assertEqual(send_batch.call_count, 2)
+        self.assertEqual(
+            sorted(notification.recipient for notification in FakeBackend.outbox if notification.channel == 'sms'),
+            ['+56900000000', '+56900000001']
+        )
+        self.assertFalse(VaccineReminder.objects.filter(is_sent=False).exists())
+
+    @override_settings(NOTIFICATION_BACKENDS={'email': 'core.notifications.FakeBackend'})
+    def test_fake_backend_failures_are_reported_per_notification(self):
+        """Test de que un fallo del backend solo afecta a su notificación"""
+        FakeBackend.reset()
+        self.addCleanup(FakeBackend.reset)
+        FakeBackend.failing = {'user1@example.com'}
+        self.create_due_reminders(3)
+        self.run_command('--concurrency', '2')
+
+        self.assertEqual(len(FakeBackend.outbox), 2)
+        self.assertEqual(
+            NotificationOutbox.objects.get().reminder.user.email,
+            'user1@example.com'
+        )
+
+    def test_unconfigured_channel_fails(self):
+        """Test de que un canal sin proveedor falla en lugar de perder el mensaje"""
+        errors = get_backend('push').send_batch([Notification('push', '1', 'Hola')])
+        self.assertEqual(errors, ['No push provider configured'])
+
+    def test_dry_run_does_not_mark_as_sent(self):
+        """Test de que --dry-run no envía ni marca recordatorios"""
+        self.create_due_reminders(2)
+        self.run_command('--dry-run')
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(VaccineReminder.objects.filter(is_sent=False).count(), 2)
+
+    def test_digest_sends_one_email_per_user(self):
+        """Test de que --digest agrupa los recordatorios de cada usuario en un solo correo"""
+        self.create_due_reminders(2)
+        user = User.objects.get(username='user0')
+        for i in range(2):
+            vaccine = PetVaccine.objects.create(pet=self.pet, vaccine_name=f"Refuerzo {i}", status='applied')
+            VaccineReminder.objects.create(
+                pet_vaccine=vaccine,
+                user=user,
+                reminder_type='upcoming',
+                reminder_date=timezone.now() - timedelta(hours=1),
+                days_before=7,
+                message="Recordatorio",
+            )
+
+        self.run_command('--digest', '--batch-size', '1')
+
+        self.assertEqual(len(mail.outbox), 2)
+        digest = next(message for message in mail.outbox if message.to == ['user0@example.com'])
+        self.assertIn('Refuerzo 0', digest.body)
+        self.assertIn('Refuerzo 1', digest.body)
+        self.assertFalse(VaccineReminder.objects.filter(is_sent=False).exists())
+
+    def test_claim_pending_by_user_limits_users(self):
+        """Test de que con by_user el límite cuenta usuarios y no recordatorios"""
+        self.create_due_reminders(3)
+        user = User.objects.get(username='user0')
+        vaccine = PetVaccine.objects.create(pet=self.pet, vaccine_name="Refuerzo", status='applied')
+        VaccineReminder.objects.create(
+            pet_vaccine=vaccine,
+            user=user,
+            reminder_type='upcoming',
+            reminder_date=timezone.now() - timedelta(hours=1),
+            days_before=1,
+            message="Recordatorio",
+        )
+
+        claimed = VaccineReminder.claim_pending('digest-worker', limit=1, by_user=True)
+
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual({reminder.user_id for reminder in claimed}, {user.id})
+
+    def test_dry_run_digest_batches_count_users(self):
+        """Test de que --dry-run --digest corta los bloques por usuario, igual que claim_pending"""
+        self.create_due_reminders(3)
+        user = User.objects.get(username='user0')
+        for i in range(3):
+            vaccine = PetVaccine.objects.create(pet=self.pet, vaccine_name=f"Refuerzo {i}", status='applied')
+            VaccineReminder.objects.create(
+                pet_vaccine=vaccine,
+                user=user,
+                reminder_type='upcoming',
+                reminder_date=timezone.now() - timedelta(hours=1),
+                days_before=i,
+                message="Recordatorio",
+            )
+
+        batches = list(SendVaccineRemindersCommand().read_batches(2, by_user=True))
+
+        users_per_batch = [[reminder.user_id for reminder in batch] for batch in batches]
+        self.assertEqual([len(set(users)) for users in users_per_batch], [2, 1])
+        self.assertEqual(sum(users.count(user.id) for users in users_per_batch), 4)
+        self.assertEqual(len([users for users in users_per_batch if user.id in users]), 1)
+
+        self.run_command('--dry-run', '--digest', '--batch-size', '1')
+        self.assertEqual(len(mail.outbox), 0)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED requiere PostgreSQL')
+class ClaimPendingConcurrencyTest(TransactionTestCase):
+    """Tests de reservas concurrentes con SKIP LOCKED (solo PostgreSQL)"""
+
+    def setUp(self):
+        species = Species.objects.create(name="Perro")
+        self.pet = Pet.objects.create(name="Buddy", species=species)
+        self.users = [User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com') for i in range(2)]
+        for user in self.users:
+            for i in range(2):
+                vaccine = PetVaccine.objects.create(pet=self.pet, vaccine_name=f"Vacuna {i}", status='applied')
+                VaccineReminder.objects.create(
+                    pet_vaccine=vaccine,
+                    user=user,
+                    reminder_type='upcoming',
+                    reminder_date=timezone.now() - timedelta(hours=1),
+                    days_before=i,
+                    message="Recordatorio",
+                )
+
+    def test_by_user_skips_users_locked_by_another_worker(self):
+        """Test de que con el primer usuario bloqueado por otro worker se reserva el siguiente"""
+        locked = threading.Event()
+        release = threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic():
+                    list(VaccineReminder.objects.select_for_update().filter(user=self.users[0]))
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            claimed = VaccineReminder.claim_pending('second-worker', limit=1, by_user=True)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(len(claimed), 2)
+        self.assertEqual({reminder.user_id for reminder in claimed}, {self.users[1].id})
+
+
+class RunReminderSchedulerTest(TestCase):
+    """Tests de los cálculos del comando run_reminder_scheduler"""
+
+    def setUp(self):
+        self.command = RunReminderSchedulerCommand()
+        self.user = User.objects.create_user(username='owner', email='owner@example.com')
+        species = Species.objects.create(name="Perro")
+        pet = Pet.objects.create(name="Buddy", species=species)
+        self.vaccine = PetVaccine.objects.create(pet=pet, vaccine_name="Rabia", status='applied')
+
+    def test_sleeps_until_next_reminder(self):
+        """Test de que duerme hasta el próximo recordatorio futuro"""
+        VaccineReminder.objects.create(
+            pet_vaccine=self.vaccine,
+            user=self.user,
+            reminder_type='upcoming',
+            reminder_date=timezone.now() + timedelta(seconds=30),
+        )
+        timeout = self.command.seconds_until_next_reminder(poll_interval=60)
+        self.assertGreater(timeout, 20)
+        self.assertLessEqual(timeout, 30)
+
+    def test_sleep_is_capped_by_poll_interval(self):
+        """Test de que sin recordatorios próximos usa poll_interval"""
+        self.assertEqual(self.command.seconds_until_next_reminder(poll_interval=60), 60)
+
+    def test_wait_returns_when_stopping(self):
+        """Test de que una señal de parada corta la espera"""
+        self.command.stopping = True
+        start = time.monotonic()
+        self.command.wait(30, listening=False)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_loop_survives_errors_and_listens_again(self):
+        """Test de que un error se registra, espera con backoff, reconecta y vuelve a hacer LISTEN"""
+        def dispatch(*args, **kwargs):
+            if dispatch.calls == 0:
+                dispatch.calls += 1
+                raise OperationalError('server closed the connection unexpectedly')
+            self.command.stopping = True
+
+        dispatch.calls = 0
+        module = 'core.management.commands.run_reminder_scheduler'
+        with mock.patch(f'{module}.signal.signal'), \
+                mock.patch(f'{module}.call_command', side_effect=dispatch), \
+                mock.patch(f'{module}.connection') as db_connection, \
+                mock.patch.object(self.command, 'listen', return_value=True) as listen, \
+                mock.patch.object(self.command, 'wait') as wait, \
+                self.assertLogs(module, level='ERROR'):
+            self.command.stdout = StringIO()
+            self.command.stderr = StringIO()
+            self.command.handle(poll_interval=60, batch_size=10, concurrency=1, rate_limit=0, lease_seconds=60)
+
+        db_connection.close.assert_called_once()
+        self.assertEqual(listen.call_count, 2)
+        wait.assert_any_call(2, listening=False)
+        self.assertIn('Iteration failed', self.command.stderr.getvalue())
+
+    def test_sigterm_stops_dispatch_between_batches(self):
+        """Test de que SIGTERM termina el bloque en curso y no reserva los siguientes"""
+        for i in range(5):
+            vaccine = PetVaccine.objects.create(pet=self.vaccine.pet, vaccine_name=f"Refuerzo {i}", status='applied')
+            VaccineReminder.objects.create(
+                pet_vaccine=vaccine,
+                user=self.user,
+                reminder_type='upcoming',
+                reminder_date=timezone.now() - timedelta(hours=1),
+                days_before=i,
+                message="Recordatorio",
+            )
+
+        deliver = SendVaccineRemindersCommand.deliver
+
+        def deliver_and_terminate(command, *args, **kwargs):
+            os.kill(os.getpid(), signal.SIGTERM)
+            return deliver(command, *args, **kwargs)
+
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            self.addCleanup(signal.signal, signum, signal.getsignal(signum))
+        with mock.patch.object(SendVaccineRemindersCommand, 'deliver', deliver_and_terminate), \
+                mock.patch.object(self.command, 'wait'):
+            self.command.stdout = StringIO()
+            self.command.stderr = StringIO()
+            self.command.handle(poll_interval=60, batch_size=2, concurrency=1, rate_limit=0, lease_seconds=60)
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(VaccineReminder.objects.filter(is_sent=True).count(), 2)
+        self.assertEqual(VaccineReminder.objects.filter(is_sent=False, claimed_by__isnull=True).count(), 3)
+        self.assertIn('Stop requested', self.command.stdout.getvalue())
+
+    def test_backoff_is_capped_by_poll_interval(self):
+        """Test de que el backoff crece con los fallos sin superar poll_interval"""
+        self.assertEqual(self.command.backoff_seconds(1, 60), 2)
+        self.assertEqual(self.command.backoff_seconds(3, 60), 8)
+        self.assertEqual(self.command.backoff_seconds(10, 60), 60)
+
+
+class VaccineReminderIndexTest(TestCase):
+    """Tests de que las consultas de recordatorios usan sus índices"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}', email=f'user{i}@example.com') for i in range(5)]
+        species = Species.objects.create(name="Perro")
+        pet = Pet.objects.create(name="Buddy", species=species)
+        vaccine = PetVaccine.objects.create(pet=pet, vaccine_name="Rabia", status='applied')
+
+        now = timezone.now()
+        VaccineReminder.objects.bulk_create([
+            VaccineReminder(
+                pet_vaccine=vaccine,
+                user=self.users[i % len(self.users)],
+                reminder_type='upcoming',
+                reminder_date=now + timedelta(hours=i - 250),
+                days_before=i,
+                # La mayoría ya enviados, como en producción
+                is_sent=i % 20 != 0,
+            )
+            for i in range(500)
+        ])
+
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('ANALYZE core_vaccinereminder')
+                # Con pocas filas el planificador preferiría un seq scan
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            else:
+                cursor.execute('ANALYZE')
+
+    def test_pending_scan_uses_partial_index(self):
+        """Test de que la búsqueda de pendientes usa el índice parcial"""
+        plan = VaccineReminder.pending().order_by('reminder_date').explain()
+        self.assertIn('reminder_pending_date_idx', plan)
+
+    def test_user_list_uses_composite_index(self):
+        """Test de que el listado por usuario usa el índice (user, reminder_date)"""
+        plan = VaccineReminder.objects.filter(user=self.users[0]).order_by('reminder_date').explain()
+        self.assertIn('reminder_user_date_idx', plan)
+
+
+class LoginCodePurgeTest(TestCase):
+    """Tests del índice de verificación y del comando purge_login_codes"""
+
+    def setUp(self):
+        self.fresh = LoginCode.objects.create(email='fresh@example.com', code='111111')
+        used = [LoginCode(email=f'used{i}@example.com', code='222222', used=True) for i in range(5)]
+        expired = [LoginCode(email=f'old{i}@example.com', code='333333') for i in range(4)]
+        LoginCode.objects.bulk_create(used + expired)
+        LoginCode.objects.filter(email__startswith='old').update(created_at=timezone.now() - timedelta(minutes=11))
+
+    def test_purge_deletes_used_and_expired_codes_in_batches(self):
+        """Test de que se borran los usados y vencidos, por bloques, y se conservan los vigentes"""
+        with CaptureQueriesContext(connection) as context:
+            call_command('purge_login_codes', '--batch-size', '3', '--sleep', '0', stdout=StringIO())
+
+        self.assertEqual(list(LoginCode.objects.all()), [self.fresh])
+        deletes = [query for query in context.captured_queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 3)
+
+    def test_verify_lookup_uses_partial_index(self):
+        """Test de que la búsqueda de VerifyLoginCode usa el índice compuesto"""
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE' if connection.vendor != 'postgresql' else 'ANALYZE core_logincode')
+        plan = LoginCode.objects.filter(
+            email='fresh@example.com',
+            code='111111',
+            used=False,
+            created_at__gte=timezone.now() - LoginCode.VALIDITY
+        ).explain()
+        self.assertIn('logincode_verify_idx', plan)
+
+
+class LoginCodeStoreTest(TestCase):
+    """Tests de los almacenamientos de códigos de login"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, email, code):
+        return self.client.post('/api/auth/verify-code/', {'email': email, 'code': code}, format='json')
+
+    def test_model_store_consumes_code_once(self):
+        """Test de que el almacenamiento por modelo acepta cada código una sola vez"""
+        store = ModelLoginCodeStore()
+        code = store.issue('model@example.com')
+
+        self.assertFalse(store.consume('model@example.com', '000000' if code != '000000' else '111111'))
+        self.assertTrue(store.consume('model@example.com', code))
+        self.assertFalse(store.consume('model@example.com', code))
+
+    def test_cache_store_consumes_code_once_without_db_writes(self):
+        """Test de que el almacenamiento en caché no escribe en la base y es de un solo uso"""
+        store = CacheLoginCodeStore()
+        with CaptureQueriesContext(connection) as context:
+            code = store.issue('cache@example.com')
+            self.assertTrue(store.consume('cache@example.com', code))
+            self.assertFalse(store.consume('cache@example.com', code))
+
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertFalse(LoginCode.objects.exists())
+
+    def test_cache_store_codes_expire(self):
+        """Test de que el código en caché vence con la validez de LoginCode"""
+        store = CacheLoginCodeStore()
+        with mock.patch.object(cache, 'set') as cache_set:
+            store.issue('ttl@example.com')
+        self.assertEqual(cache_set.call_args.kwargs['timeout'], 600)
+
+    @override_settings(LOGIN_CODE_STORE='core.login_codes.CacheLoginCodeStore')
+    def test_login_flow_with_cache_store(self):
+        """Test del flujo completo de login con códigos en caché"""
+        self.client.post('/api/auth/request-code/', {'email': 'flow@example.com'}, format='json')
+        get_email_queue().flush(timeout=5)
+        code = re.search(r'\b(\d{6})\b', mail.outbox[0].body).group(1)
+
+        self.assertEqual(self.login('flow@example.com', code).status_code, 200)
+        self.assertEqual(self.login('flow@example.com', code).status_code, 400)
+        self.assertFalse(LoginCode.objects.exists())
+
+
+class ResendMailerTest(TestCase):
+    """Tests del cliente compartido de Resend y su EMAIL_BACKEND"""
+
+    def mock_response(self, payload, status_code=200):
+        response = mock.Mock(status_code=status_code)
+        response.json.return_value = payload
+        return response
+
+    def test_batch_send_is_split_in_provider_sized_calls(self):
+        """Test de que send_batch usa /emails/batch en bloques del límite de Resend"""
+        client = ResendClient('re_test')
+        emails = [{'to': [f'user{i}@example.com']} for i in range(RESEND_BATCH_LIMIT + 50)]
+        with mock.patch.object(client.session, 'post', return_value=self.mock_response({'data': []})) as post:
+            client.send_batch(emails)
+
+        self.assertEqual(post.call_count, 2)
+        self.assertTrue(all(call.args[0].endswith('/emails/batch') for call in post.call_args_list))
+        self.assertEqual(len(post.call_args_list[1].kwargs['json']), 50)
+
+    @override_settings(RESEND_API_KEY='re_test')
+    def test_client_is_shared_by_the_process(self):
+        """Test de que todas las llamadas reutilizan el mismo cliente y su sesión"""
+        self.assertIs(get_client(), get_client())
+
+    @override_settings(EMAIL_BACKEND='core.mailer.ResendEmailBackend')
+    def test_reminder_emails_go_out_in_one_batch_call(self):
+        """Test de que los recordatorios por correo salen en una sola llamada batch"""
+        client = mock.Mock()
+        with mock.patch('core.mailer.get_client', return_value=client):
+            errors = EmailBackend('email').send_batch([
+                Notification('email', f'user{i}@example.com', 'Hola', subject='Recordatorio')
+                for i in range(3)
+            ])
+
+        self.assertEqual(errors, [None, None, None])
+        client.send_batch.assert_called_once()
+        self.assertEqual(client.send_batch.call_args.args[0][0]['text'], 'Hola')
+        client.send.assert_not_called()
+
+    @override_settings(EMAIL_BACKEND='core.mailer.ResendEmailBackend')
+    def test_rejected_batch_isolates_the_failing_message(self):
+        """Test de que un lote rechazado se reenvía uno a uno para identificar el fallo"""
+        def send(params):
+            if params['to'] == ['bad']:
+                raise ResendError('Invalid recipient', status_code=422)
+            return {'id': '1'}
+
+        client = mock.Mock()
+        client.send_batch.side_effect = ResendError('Invalid recipient', status_code=422)
+        client.send.side_effect = send
+        with mock.patch('core.mailer.get_client', return_value=client):
+            errors = EmailBackend('email').send_batch([
+                Notification('email', 'ok@example.com', 'Hola'),
+                Notification('email', 'bad', 'Hola'),
+            ])
+
+        self.assertEqual(errors, [None, 'Invalid recipient'])
+
+    @override_settings(EMAIL_BACKEND='core.mailer.ResendEmailBackend')
+    def test_rejected_chunk_does_not_resend_delivered_chunks(self):
+        """Test de que un bloque de más de 100 correos solo reenvía el trozo rechazado"""
+        client = mock.Mock()
+        client.send_batch.side_effect = [{'data': []}, ResendError('Invalid `to` field', status_code=422)]
+        client.send.return_value = {'id': '1'}
+        notifications = [
+            Notification('email', f'user{i}@example.com', 'Hola')
+            for i in range(RESEND_BATCH_LIMIT + 50)
+        ]
+        with mock.patch('core.mailer.get_client', return_value=client):
+            errors = EmailBackend('email').send_batch(notifications)
+
+        self.assertEqual(errors, [None] * len(notifications))
+        self.assertEqual(client.send_batch.call_count, 2)
+        self.assertEqual(len(client.send_batch.call_args_list[0].args[0]), RESEND_BATCH_LIMIT)
+        resent = [call.args[0]['to'][0] for call in client.send.call_args_list]
+        self.assertEqual(resent, [f'user{i}@example.com' for i in range(RESEND_BATCH_LIMIT, RESEND_BATCH_LIMIT + 50)])
+
+    @override_settings(EMAIL_BACKEND='core.mailer.ResendEmailBackend')
+    def test_batch_is_not_resent_after_a_transport_error(self):
+        """Test de que tras un timeout o un 5xx el lote queda fallido sin reenviarse uno a uno"""
+        notifications = [Notification('email', f'user{i}@example.com', 'Hola') for i in range(3)]
+        for error in (requests.Timeout('Read timed out'), ResendError('Internal error', status_code=500)):
+            client = mock.Mock()
+            client.send_batch.side_effect = error
+            with mock.patch('core.mailer.get_client', return_value=client):
+                errors = EmailBackend('email').send_batch(notifications)
+
+            self.assertEqual(errors, [str(error)] * 3)
+            client.send.assert_not_called()
+
+    @override_settings(EMAIL_BACKEND='core.mailer.ResendEmailBackend')
+    def test_one_by_one_fallback_stops_at_transport_error(self):
+        """Test de que el reenvío uno a uno no encadena timeouts: el resto queda para el outbox"""
+        client = mock.Mock()
+        client.send_batch.side_effect = ResendError('Invalid `to` field', status_code=422)
+        client.send.side_effect = requests.Timeout('Read timed out')
+        with mock.patch('core.mailer.get_client', return_value=client):
+            errors = EmailBackend('email').send_batch([
+                Notification('email', f'user{i}@example.com', 'Hola') for i in range(5)
+            ])
+
+        self.assertEqual(errors, ['Read timed out'] * 5)
+        self.assertEqual(client.send.call_count, 1)
+
+    def test_batch_calls_carry_an_idempotency_key(self):
+        """Test de que /emails/batch lleva un Idempotency-Key estable para el mismo contenido"""
+        client = ResendClient('re_test')
+        emails = [{'to': ['a@example.com'], 'subject': 'Hola'}]
+        with mock.patch.object(client.session, 'post', return_value=self.mock_response({'data': []})) as post:
+            client.send_batch(emails)
+            client.send_batch(emails)
+            client.send_batch([{'to': ['b@example.com'], 'subject': 'Hola'}])
+
+        keys = [call.kwargs['headers']['Idempotency-Key'] for call in post.call_args_list]
+        self.assertEqual(keys[0], keys[1])
+        self.assertNotEqual(keys[0], keys[2])
+
+    def test_request_login_code_sends_html_email(self):
+        """Test de que el código de login se envía por el backend de correo de Django"""
+        response = APIClient().post('/api/auth/request-code/', {'email': 'login@example.com'}, format='json')
+        self.assertTrue(get_email_queue().flush(timeout=5))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 1)
+        code = LoginCode.objects.get(email='login@example.com').code
+        message = mail.outbox[0]
+        self.assertEqual(message.to, ['login@example.com'])
+        self.assertIn(code, message.body)
+        html, mimetype = message.alternatives[0]
+        self.assertEqual(mimetype, 'text/html')
+        self.assertIn(code, html)
+        self.assertIn('http://testserver/static/core/img/petfans-logo.png', html)
+        self.assertNotIn('base64', html)
+
+
+class LoginCodeEmailTest(TestCase):
+    """Tests de la plantilla del correo con el código de login"""
+
+    def test_template_is_not_reloaded_per_email(self):
+        """Test de que la plantilla se compila al importar y no en cada correo"""
+        with mock.patch('django.template.loader.get_template') as get_template:
+            build_login_code_email('a@example.com', '123456')
+            build_login_code_email('b@example.com', '654321')
+        get_template.assert_not_called()
+
+    @override_settings(EMAIL_LOGO_URL='https://cdn.example.com/logo.png')
+    def test_logo_is_referenced_by_url(self):
+        """Test de que el logo va por URL y el correo no lleva imágenes incrustadas"""
+        message = build_login_code_email('a@example.com', '123456')
+        html = message.alternatives[0][0]
+
+        self.assertIn('src="https://cdn.example.com/logo.png"', html)
+        self.assertEqual(message.attachments, [])
+        self.assertLess(len(html), 6000)
+
+
+class EmailQueueTest(TestCase):
+    """Tests del envío de correos en segundo plano"""
+
+    def test_request_code_does_not_wait_for_the_provider(self):
+        """Test de que la respuesta no espera al proveedor de correo"""
+        release = threading.Event()
+        original_send = EmailMessage.send
+
+        def slow_send(message, fail_silently=False):
+            release.wait(5)
+            return original_send(message, fail_silently=fail_silently)
+
+        with mock.patch.object(EmailMessage, 'send', slow_send):
+            start = time.monotonic()
+            response = APIClient().post('/api/auth/request-code/', {'email': 'slow@example.com'}, format='json')
+            elapsed = time.monotonic() - start
+            release.set()
+            self.assertTrue(get_email_queue().flush(timeout=5))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(elapsed, 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_send_failures_are_logged_and_counted(self):
+        """Test de que un fallo de envío se registra en el log y los contadores, no en la respuesta"""
+        failed_before = get_stats()['failed']
+        with mock.patch.object(EmailMessage, 'send', side_effect=ConnectionError('Provider down')):
+            with self.assertLogs('core.email_queue', level='ERROR') as logs:
+                response = APIClient().post('/api/auth/request-code/', {'email': 'down@example.com'}, format='json')
+                self.assertTrue(get_email_queue().flush(timeout=5))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('down@example.com', logs.output[0])
+        self.assertEqual(get_stats()['failed'], failed_before + 1)
+
+    def test_full_queue_sends_inline(self):
+        """Test de que con la cola llena el correo se envía en la petición en lugar de perderse"""
+        email_queue = EmailQueue(maxsize=1)
+        email_queue.start = lambda: None
+        email_queue.enqueue(EmailMessage('Encolado', 'Hola', to=['queued@example.com']))
+        email_queue.enqueue(EmailMessage('En línea', 'Hola', to=['inline@example.com']))
+
+        self.assertEqual(email_queue.stats['inline'], 1)
+        self.assertEqual([message.to for message in mail.outbox], [['inline@example.com']])
+
+
+class AuthThrottleTest(TestCase):
+    """Tests del throttling por IP y por email de los endpoints de login"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client = APIClient()
+
+    def request_code(self, email, ip='10.0.0.1'):
+        return self.client.post('/api/auth/request-code/', {'email': email}, format='json', REMOTE_ADDR=ip)
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'request_code_email': '2/h'}})
+    def test_email_limit_returns_429_with_retry_after(self):
+        """Test de que al agotar el límite de un email se responde 429 con Retry-After"""
+        self.assertEqual(self.request_code('bot@example.com').status_code, 201)
+        self.assertEqual(self.request_code('BOT@example.com', ip='10.0.0.2').status_code, 201)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.request_code('bot@example.com', ip='10.0.0.3')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertLessEqual(int(response['Retry-After']), 2 * 3600)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(self.request_code('other@example.com').status_code, 201)
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'verify_code_ip': '3/m'}})
+    def test_ip_limit_applies_to_verify_attempts(self):
+        """Test de que una IP no puede probar códigos sin límite"""
+        statuses = [
+            self.client.post(
+                '/api/auth/verify-code/', {'email': f'user{i}@example.com', 'code': '000000'},
+                format='json', REMOTE_ADDR='10.0.0.9'
+            ).status_code
+            for i in range(4)
+        ]
+        self.assertEqual(statuses, [400, 400, 400, 429])
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'request_code_ip': '60/m'}})
+    def test_window_frees_up_over_time(self):
+        """Test de que la ventana anterior deja de contar a medida que se desliza"""
+        throttle = AuthIPThrottle()
+        view = mock.Mock(throttle_scope='request_code')
+        request = mock.Mock(META={'REMOTE_ADDR': '10.0.0.5'})
+        with mock.patch('core.throttling.time.time', return_value=1000.0):
+            self.assertEqual(sum(throttle.allow_request(request, view) for _ in range(61)), 60)
+            # Quedan 20s de ventana y en la siguiente las 60 pesan 59 tras 1s más
+            self.assertEqual(throttle.wait(), 21)
+        with mock.patch('core.throttling.time.time', return_value=1021.0):
+            self.assertTrue(throttle.allow_request(request, view))
+            self.assertFalse(throttle.allow_request(request, view))
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'request_code_ip': '30/h'}})
+    def test_spoofed_forwarded_for_does_not_reset_ip_bucket(self):
+        """Test de que cambiar X-Forwarded-For en cada petición no evita el límite por IP"""
+        statuses = [
+            self.client.post(
+                '/api/auth/request-code/', {'email': f'user{i}@example.com'}, format='json',
+                REMOTE_ADDR='10.0.0.7', HTTP_X_FORWARDED_FOR=f'198.51.100.{i}'
+            ).status_code
+            for i in range(40)
+        ]
+        self.assertEqual(statuses.count(201), 30)
+        self.assertEqual(statuses[30:], [429] * 10)
+
+    @override_settings(REST_FRAMEWORK={'NUM_PROXIES': 1, 'DEFAULT_THROTTLE_RATES': {'request_code_ip': '2/h'}})
+    def test_ip_behind_proxy_uses_last_forwarded_address(self):
+        """Test de que detrás de un proxy cuenta la IP que agrega el proxy, no la del cliente"""
+        statuses = [
+            self.client.post(
+                '/api/auth/request-code/', {'email': f'user{i}@example.com'}, format='json',
+                REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR=f'198.51.100.{i}, 203.0.113.7'
+            ).status_code
+            for i in range(3)
+        ]
+        self.assertEqual(statuses, [201, 201, 429])
+
+    @override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'verify_code_email': '10/h'}})
+    def test_concurrent_requests_cannot_exceed_email_limit(self):
+        """Test de que una ráfaga concurrente contra un email no pasa más veces que el límite"""
+        class SlowCache:
+            """Caché con ~5 ms por operación, como un Redis remoto"""
+            def __getattr__(self, name):
+                method = getattr(cache, name)
+
+                def slow(*args, **kwargs):
+                    time.sleep(0.005)
+                    return method(*args, **kwargs)
+                return slow
+
+        view = mock.Mock(throttle_scope='verify_code')
+        request = mock.Mock(data={'email': 'victim@example.com'})
+        barrier = threading.Barrier(50)
+        results = []
+
+        def attempt():
+            throttle = AuthEmailThrottle()
+            barrier.wait()
+            results.append(throttle.allow_request(request, view))
+
+        with mock.patch('core.throttling.cache', SlowCache()):
+            threads = [threading.Thread(target=attempt) for _ in range(50)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(results), 50)
+        self.assertEqual(results.count(True), 10)
@@ -0,0 +1,106 @@
+"""
+Throttling de los endpoints de autenticación.
+
+Ventana deslizante aproximada guardada en la caché de Django (Redis en
+producción), por IP y por email: un contador por ventana fija, y la ventana
+anterior cuenta en proporción al tiempo que aún la solapa. Los contadores se
+actualizan con add/incr atómicos, así que ni una ráfaga concurrente supera la
+tasa ni un usuario legítimo recibe 429 por coincidir con otra petición. Corta el
+tráfico sostenido antes de que llegue a Postgres o a Resend. Las tasas se
+configuran en REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] con el scope
+'<throttle_scope de la vista>_<ip|email>'; DRF responde 429 con Retry-After.
+
+La IP sale de get_ident() de DRF: REST_FRAMEWORK['NUM_PROXIES'] debe indicar
+cuántos proxies hay delante, o un X-Forwarded-For inventado por el cliente
+daría un contador nuevo en cada petición.
+"""
+import hashlib
+import math
+import time
+from contextlib import suppress
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """Base de los throttles: las subclases definen `kind` y la clave de cada petición"""
+    kind = None
+
+    def get_key_value(self, request):
+        raise NotImplementedError
+
+    @staticmethod
+    def parse_rate(rate):
+        """'10/m' -> (10 peticiones, 60 segundos)"""
+        count, period = rate.split('/')
+        return int(count), PERIODS[period[0]]
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = f'{getattr(view, "throttle_scope", None)}_{self.kind}'
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        value = self.get_key_value(request)
+        if not rate or not value:
+            return True
+
+        capacity, period = self.parse_rate(rate)
+        key = f'throttle:{scope}:{hashlib.sha256(value.encode()).hexdigest()}'
+        now = time.time()
+        window = int(now // period)
+        offset = now % period
+        current_key = f'{key}:{window}'
+
+        # add + incr son atómicos (Redis y memoria local): cada petición de una ráfaga
+        # concurrente recibe un contador distinto, sin locks que puedan quedar ocupados
+        cache.add(current_key, 0, timeout=period * 2)
+        try:
+            count = cache.incr(current_key)
+        except ValueError:
+            # La caché desalojó la clave entre add e incr
+            cache.add(current_key, 1, timeout=period * 2)
+            count = 1
+
+        # La ventana anterior pesa lo que le falta por salir de la ventana deslizante
+        previous = cache.get(f'{key}:{window - 1}', 0)
+        if previous * (period - offset) / period + count <= capacity:
+            return True
+
+        # Una petición rechazada no ocupa cupo
+        with suppress(ValueError):
+            cache.decr(current_key)
+        self.wait_seconds = self.seconds_until_allowed(capacity, period, previous, count - 1, offset)
+        return False
+
+    @staticmethod
+    def seconds_until_allowed(capacity, period, previous, used, offset):
+        """
+        Segundos hasta que una petición más cabe en la ventana deslizante; `offset`
+        son los segundos transcurridos de la ventana actual
+        """
+        if used < capacity:
+            # Cabe en esta ventana cuando la anterior pese lo suficientemente poco
+            return (previous - capacity + used + 1) * period / previous - offset
+        # Ventana llena: en la siguiente estas peticiones pasan a ser la ventana anterior
+        return period - offset + (used - capacity + 1) * period / used
+
+    def wait(self):
+        return math.ceil(self.wait_seconds) if self.wait_seconds else None
+
+
+class AuthIPThrottle(SlidingWindowThrottle):
+    kind = 'ip'
+
+    def get_key_value(self, request):
+        return self.get_ident(request)
+
+
+class AuthEmailThrottle(SlidingWindowThrottle):
+    kind = 'email'
+
+    def get_key_value(self, request):
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        return email.strip().lower() if isinstance(email, str) else None
@@ -1,7 +1,8 @@
-from django.conf import settings
 from django.shortcuts import render
+from django.core.exceptions import ValidationError
 from django.db import transaction
-import resend
+from django.db.models import Case, Count, Max, OuterRef, Prefetch, Q, Subquery, When
+from django.utils.cache import get_conditional_response, patch_cache_control
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
@@ -12,37 +13,269 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from django.utils import timezone
-import random
-import string
-from .models import LoginCode, Species, Breed, Pet, UserProfile, PetVaccine, VaccineReminder, PetUser, PetWeight
+import hashlib
+from .email_queue import send_async
+from .emails import build_login_code_email
+from .login_codes import get_login_code_store
+from .catalog import CATALOG_CACHE_TIMEOUT, get_cached_catalog, get_catalog_version, normalize_search_text
+from .models import Species, Breed, Pet, UserProfile, PetVaccine, VaccineReminder, PetUser, PetWeight
+from .throttling import AuthEmailThrottle, AuthIPThrottle
 from .serializers import (
     SpeciesSerializer, BreedSerializer, PetSerializer, UserProfileSerializer, 
-    PetVaccineSerializer, VaccineReminderSerializer, PetWeightSerializer
+    PetVaccineSerializer, VaccineReminderSerializer, PetWeightSerializer, PetSummarySerializer
 )
-from datetime import timedelta
+from .pagination import (
+    PetCursorPagination, PetVaccineCursorPagination,
+    VaccineReminderCursorPagination, PetWeightCursorPagination
+)
+
+
+class CatalogCacheMixin:
+    """
+    Sirve el listado del catálogo desde core.catalog y agrega ETag y
+    Cache-Control largos a las lecturas. El ETag es la versión del catálogo,
+    que cambia con cualquier alta, edición o borrado.
+    """
+    catalog_name = None
+
+    def list(self, request, *args, **kwargs):
+        def build():
+            return list(self.get_serializer(self.get_queryset(), many=True).data)
+
+        def handler(version):
+            return Response(get_cached_catalog(self.catalog_name, build, version=version))
+
+        return self.catalog_response(request, 'list', handler)
 
+    def retrieve(self, request, *args, **kwargs):
+        def handler(version):
+            return super(CatalogCacheMixin, self).retrieve(request, *args, **kwargs)
 
-class SpeciesViewSet(viewsets.ModelViewSet):
+        return self.catalog_response(request, kwargs.get('pk'), handler)
+
+    def catalog_response(self, request, key, handler):
+        version = get_catalog_version()
+        etag = '"%s"' % hashlib.md5(f'{self.catalog_name}:{key}:{version}'.encode()).hexdigest()
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(version)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            patch_cache_control(response, public=True, max_age=CATALOG_CACHE_TIMEOUT)
+        return response
+
+
+class SpeciesViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Species.objects.all()
     serializer_class = SpeciesSerializer
+    catalog_name = 'species'
 
 
-class BreedViewSet(viewsets.ModelViewSet):
-    queryset = Breed.objects.all()
+class BreedViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
+    queryset = Breed.objects.select_related('species')
     serializer_class = BreedSerializer
+    catalog_name = 'breeds'
+    search_default_limit = 20
+    search_max_limit = 50
+
+    def list(self, request, *args, **kwargs):
+        """Catálogo completo, o búsqueda con ?species=<id>&q=<prefijo>&limit=<n>"""
+        if 'species' not in request.query_params and 'q' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+
+        def handler(version):
+            return Response(self.get_serializer(self.search_queryset(), many=True).data)
+
+        return self.catalog_response(request, request.get_full_path(), handler)
+
+    def search_queryset(self):
+        """
+        Busca por prefijo del nombre normalizado (sin tildes ni mayúsculas) o por
+        prefijo de cualquier palabra: "bichon" y "frise" encuentran "Bichón Frisé".
+        Primero las coincidencias al inicio del nombre, luego por orden alfabético.
+        """
+        queryset = self.get_queryset()
+
+        species_id = self.request.query_params.get('species')
+        if species_id:
+            if not species_id.isdigit():
+                return queryset.none()
+            queryset = queryset.filter(species_id=species_id)
+
+        query = normalize_search_text(self.request.query_params.get('q'))
+        if query:
+            queryset = queryset.filter(
+                Q(search_name__startswith=query) | Q(search_name__contains=f' {query}')
+            ).annotate(
+                prefix_rank=Case(When(search_name__startswith=query, then=0), default=1)
+            ).order_by('prefix_rank', 'search_name')
+        else:
+            queryset = queryset.order_by('search_name')
+
+        try:
+            limit = int(self.request.query_params.get('limit', self.search_default_limit))
+        except ValueError:
+            limit = self.search_default_limit
+        limit = max(1, min(limit, self.search_max_limit))
+
+        return queryset[:limit]
 
 
 class PetViewSet(viewsets.ModelViewSet):
     queryset = Pet.objects.filter(is_active=True)
     serializer_class = PetSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PetCursorPagination
+
+    def get_access_queryset(self):
+        """Mascotas activas donde el usuario tiene algún rol"""
+        return Pet.objects.filter(
+            PetUser.access_exists(self.request.user),
+            is_active=True
+        )
 
     def get_queryset(self):
         """Filtrar mascotas activas donde el usuario tiene algún rol"""
-        return Pet.objects.filter(
-            is_active=True,
-            user_relationships__user=self.request.user
-        ).distinct()
+        queryset = self.get_access_queryset()
+
+        if self.action in ('list', 'retrieve'):
+            queryset = self.plan_serializer_queryset(queryset)
+
+        return queryset
+
+    def plan_serializer_queryset(self, queryset):
+        """
+        Precarga lo que PetSerializer va a renderizar (según ?fields= y ?expand=)
+        para que el listado use un número fijo de consultas, sin importar cuántas
+        mascotas devuelva.
+        """
+        field_names = PetSerializer.resolve_field_names(
+            self.get_requested_fields(), self.get_requested_expansions()
+        )
+        queryset = queryset.select_related('species', 'breed__species')
+
+        prefetches = []
+        if 'vaccines' in field_names:
+            prefetches.append(
+                Prefetch('vaccines', queryset=PetVaccine.objects.order_by('-applied_date', '-created_at'))
+            )
+        if 'care_team' in field_names:
+            prefetches.append(Prefetch(
+                'user_relationships',
+                queryset=PetUser.objects.select_related('user__profile').order_by('created_at', 'id')
+            ))
+
+        # user_role y last_weight se resuelven en SQL como subconsultas correlacionadas
+        annotations = {}
+        if 'user_role' in field_names:
+            annotations['caller_role'] = Subquery(
+                PetUser.objects.filter(pet=OuterRef('pk'), user=self.request.user).values('role')[:1]
+            )
+        if 'last_weight' in field_names:
+            annotations.update(self.get_last_weight_annotations())
+
+        return queryset.annotate(**annotations).prefetch_related(*prefetches)
+
+    def get_last_weight_annotations(self):
+        """Peso y fecha del último PetWeight (por -date, -created_at) de cada mascota"""
+        latest_weight = PetWeight.objects.filter(pet=OuterRef('pk')).order_by('-date', '-created_at')
+        return {
+            'last_weight_value': Subquery(latest_weight.values('weight')[:1]),
+            'last_weight_date': Subquery(latest_weight.values('date')[:1]),
+        }
+
+    def get_query_param_list(self, name):
+        """Lee un parámetro separado por comas; None si no viene en la URL"""
+        value = self.request.query_params.get(name)
+        if value is None:
+            return None
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def get_requested_fields(self):
+        """Campos pedidos con ?fields= (None = todos)"""
+        return self.get_query_param_list('fields')
+
+    def get_requested_expansions(self):
+        """
+        Relaciones anidadas pedidas con ?expand=. El listado no expande nada por
+        defecto; el detalle mantiene todas las relaciones (None = todas).
+        """
+        expand = self.get_query_param_list('expand')
+        if expand is None and self.action == 'list':
+            return []
+        return expand
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """
+        Responde 304 a If-None-Match sin serializar nada si los datos visibles
+        para el usuario no cambiaron. No se envía Last-Modified: una fecha no
+        refleja borrados ni accesos revocados, el ETag sí.
+        """
+        etag = self.get_etag()
+        if etag is None:
+            # pk con formato inválido: el handler responde 404 como siempre
+            return handler(request, *args, **kwargs)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def get_etag(self):
+        """
+        Calcula el ETag a partir de agregados baratos: cantidad y último
+        updated_at de las mascotas visibles, sus PetUser, vacunas y pesos, los
+        datos del equipo de cuidado y la versión del catálogo. None si el pk de
+        la URL no es válido.
+        """
+        pets = self.get_access_queryset()
+        if self.kwargs.get('pk'):
+            try:
+                pk = Pet._meta.pk.to_python(self.kwargs['pk'])
+            except ValidationError:
+                return None
+            pets = pets.filter(pk=pk)
+        pet_ids = pets.values('pk')
+
+        aggregates = [
+            pets.aggregate(count=Count('pk'), last=Max('updated_at')),
+            PetUser.objects.filter(pet__in=pet_ids).aggregate(count=Count('pk'), last=Max('updated_at')),
+            PetVaccine.objects.filter(pet__in=pet_ids).aggregate(count=Count('pk'), last=Max('updated_at')),
+            PetWeight.objects.filter(pet__in=pet_ids).aggregate(count=Count('pk'), last=Max('updated_at')),
+        ]
+        # UserProfile no tiene updated_at: care_team muestra estos campos tal cual
+        care_team = PetUser.objects.filter(pet__in=pet_ids).values_list(
+            'user_id', 'user__email', 'user__profile__full_name', 'user__profile__avatar'
+        ).distinct().order_by('user_id')
+
+        # La salida también depende del usuario, los parámetros y la fecha (edad, vacunas vencidas)
+        fingerprint = repr((
+            self.request.user.pk,
+            self.request.get_full_path(),
+            timezone.now().date(),
+            get_catalog_version(),
+            [(item['count'], item['last']) for item in aggregates],
+            list(care_team),
+        ))
+        return '"%s"' % hashlib.md5(fingerprint.encode()).hexdigest()
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in ('list', 'retrieve'):
+            kwargs.setdefault('fields', self.get_requested_fields())
+            kwargs.setdefault('expand', self.get_requested_expansions())
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -80,6 +313,31 @@ class PetViewSet(viewsets.ModelViewSet):
         instance.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Resumen para la pantalla de inicio: por mascota, vacunas vencidas y
+        próximas, fecha del próximo recordatorio y último peso, en una consulta.
+        """
+        today = timezone.now().date()
+        pending = Q(vaccines__status__in=['pending', 'scheduled'])
+        next_reminder = VaccineReminder.objects.filter(
+            pet_vaccine__pet=OuterRef('pk'),
+            user=request.user,
+            is_sent=False,
+            is_active=True
+        ).order_by('reminder_date')
+
+        pets = self.get_access_queryset().annotate(
+            overdue_vaccines=Count('vaccines', filter=pending & Q(vaccines__next_dose_date__lt=today)),
+            upcoming_vaccines=Count('vaccines', filter=pending & Q(vaccines__next_dose_date__gte=today)),
+            next_reminder_date=Subquery(next_reminder.values('reminder_date')[:1]),
+            **self.get_last_weight_annotations()
+        )
+
+        serializer = PetSummarySerializer(pets, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post'])
     def invite(self, request, pk=None):
         """Endpoint para invitar usuarios a una mascota"""
@@ -196,6 +454,7 @@ class PetViewSet(viewsets.ModelViewSet):
 class PetVaccineViewSet(viewsets.ModelViewSet):
     queryset = PetVaccine.objects.all()
     serializer_class = PetVaccineSerializer
+    pagination_class = PetVaccineCursorPagination
     
     def get_queryset(self):
         """Filtrar vacunas por mascota y usuario autenticado"""
@@ -203,7 +462,7 @@ class PetVaccineViewSet(viewsets.ModelViewSet):
         
         # Filtrar por usuario autenticado - solo vacunas de mascotas del usuario
         if self.request.user.is_authenticated:
-            queryset = queryset.filter(pet__owners=self.request.user)
+            queryset = queryset.filter(PetUser.access_exists(self.request.user, pet_ref='pet'))
         
         # Filtrar por mascota específica (parámetro ?pet=id)
         pet_id = self.request.query_params.get('pet')
@@ -226,14 +485,18 @@ class PetVaccineViewSet(viewsets.ModelViewSet):
 class VaccineReminderViewSet(viewsets.ModelViewSet):
     queryset = VaccineReminder.objects.all()
     serializer_class = VaccineReminderSerializer
+    pagination_class = VaccineReminderCursorPagination
     
     def get_queryset(self):
         """Filtrar recordatorios por usuario autenticado"""
         queryset = super().get_queryset()
         
-        # Filtrar por usuario si está autenticado
+        # Filtrar por usuario si está autenticado (y que siga teniendo acceso a la mascota)
         if self.request.user.is_authenticated:
-            queryset = queryset.filter(user=self.request.user)
+            queryset = queryset.filter(
+                PetUser.access_exists(self.request.user, pet_ref='pet_vaccine__pet'),
+                user=self.request.user
+            )
         
         # Filtrar por parámetros de consulta
         pet_id = self.request.query_params.get('pet_id')
@@ -263,6 +526,7 @@ class PetWeightViewSet(viewsets.ModelViewSet):
     queryset = PetWeight.objects.all()
     serializer_class = PetWeightSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = PetWeightCursorPagination
 
     def get_queryset(self):
         """Filtrar pesos por mascota y aplicar reglas de plan"""
@@ -273,7 +537,7 @@ class PetWeightViewSet(viewsets.ModelViewSet):
             return queryset.none()
             
         # Verificar acceso a la mascota
-        pet = Pet.objects.filter(id=pet_id, user_relationships__user=self.request.user).first()
+        pet = Pet.objects.filter(PetUser.access_exists(self.request.user), id=pet_id).first()
         if not pet:
             return queryset.none()
             
@@ -301,110 +565,30 @@ class PetWeightViewSet(viewsets.ModelViewSet):
 
 
 class RequestLoginCode(APIView):
+    throttle_classes = [AuthIPThrottle, AuthEmailThrottle]
+    throttle_scope = 'request_code'
+
     def post(self, request):
         email = request.data.get('email')
 
         if not email:
             return Response({'error': 'Email is required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Generate a 6-digit code
-        code = ''.join(random.choices(string.digits, k=6))
-
-        # Save the code in the database
-        LoginCode.objects.create(email=email, code=code)
+        # Generate and store a 6-digit code (LOGIN_CODE_STORE: model or cache)
+        code = get_login_code_store().issue(email)
 
-        # Send the code by email via Resend API
-        try:
-            html_content = f'''
-<!DOCTYPE html>
-<html lang="es">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Código de acceso - Petfans</title>
-</head>
-<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #d1d9e0;">
-    <table width="100%" cellpadding="0" cellspacing="0" style="background-color: #d1d9e0; padding: 40px 20px;">
-        <tr>
-            <td align="center">
-                <table width="600" cellpadding="0" cellspacing="0" style="background-color: #ffffff; border-radius: 12px; overflow: hidden; box-shadow: 0 2px 8px rgba(0,0,0,0.1);">
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: #ffffff; padding: 30px 20px; text-align: center;">
-                            <!-- Logo Petfans -->
-                            <img src="data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAMgAAABkCAYAAADDhn8LAAAACXBIWXMAAAsTAAALEwEAmpwYAAAAAXNSR0IArs4c6QAAAARnQU1BAACxjwv8YQUAAG+6SURBVHgB7Z0HfFTF+sffo/feexFQQOkgKCBNQFSwIYiI4lV/Ks/eg4oNsWJFsQAqoNhQEFFBmhSld+lI772nbM7/O7OHPZss2d1s2QTe7yef3OzZM2fOnJn5lef9PfMOEkw2NhhjwqC7XN3fN7WzcJNhMBB/4zpM5iuAB8DFpPkHXIDGYJjRb+qMlPNs36atd38Z/87n//WllmXGl/pJ0e1vnkx58aOBN+5vGF7TFUB/jtdcuJzcQWH6U7XlWJhDYddxvIq31c5r9TU3Nps+5jqAFRr+rPW3OTu7+qtnU1/5/H/T1m9dK5qyIp+xAebdO4ybw3jNe9/zPqB1lG72LFTW1cjouukNZ7rWzxgw5cIp/Dm+wGtM8l9w23WNf0sF+V/3H+3M6gEHcEQMp9edWnD7+4/dc7LBdTY6ZX3lxI2dU78d8PPuLcC+4IYyQYPZGt8JhMFgJMvGQqGN/2ZTgDGzGNR42RXQh7EahGEi0PtjsjLN9+kMb6YujB00a/kX//rf/0bZtBj4N8S/EvJ/ENx67hUPflcvce/Wq7JurxlW58KR5utPXN9j/5k2B85v3r56nayIQWET1sDGCzZF7O/XNh0BYJgaOW6iEf3EtR3H8RoKr9Xmbbf4W2Mzmv3+W3aZW4fkv/3f/05t/7/8u+FfCfk/AE17j1/i9vdXP3Qy6dL+s1fQPdcOPHD+xt7z1rcs4VVjD95/ZsuV9uf3X0g8fG79hq1bN62d/t///c8+aP8G+FdC/o/CtvQlr7V8M3zq/clL7z13+Ox919KOI/SasXvXtY2cB/afPXl27+r1W7b+K9VE+VdC/o/hze71u7n9h4Gz9xw5sPPYkb3HTx1ff+D8lqW79y7fkbSBfx8xkn/PJf8L4P8BKFt16zV+kfb9kw8ePHL20Pnjx/ecPbqV/27ZlbRx4/r168b89yD5L+4JNPH+0aZPj/y84b9o/pWOuQ7/S8e/EvI3g/5/7f8/Bfh3J/r/A8DUH7h58hOeAAAAJXRFWHRkYXRlOmNyZWF0ZQAyMDI1LTAyLTIyVDIyOjIwOjMxKzAwOjAwCJlRjQAAACV0RVh0ZGF0ZTptb2RpZnkAMjAyNS0wMi0yMlQyMjoyMDozMSswMDowMHnE6TEAAAAodEVYdGRhdGU6dGltZXN0YW1wADIwMjUtMDItMjJUMjI6MjA6MzErMDA6MDCZnqnKAAAAAElFTkSuQmCC" alt="Petfans" style="max-height: 70px; width: auto; display: block; margin: 0 auto;" />
-                        </td>
-                    </tr>
-                    
-                    <!-- Content -->
-                    <tr>
-                        <td style="padding: 40px 30px;">
-                            <h2 style="margin: 0 0 20px 0; color: #1c2220; font-size: 24px; font-weight: 600;">
-                                Tu código de acceso
-                            </h2>
-                            <p style="margin: 0 0 30px 0; color: #4b5563; font-size: 16px; line-height: 1.5;">
-                                Has solicitado acceder a tu cuenta de Petfans. Utiliza el siguiente código para iniciar sesión:
-                            </p>
-                            
-                            <!-- Code Box -->
-                            <div style="background: #ffffff; border: 3px solid #e28774; border-radius: 12px; padding: 30px; text-align: center; margin: 30px 0; box-shadow: 0 4px 6px rgba(226, 135, 116, 0.15);">
-                                <div style="font-size: 14px; color: #6b7280; margin-bottom: 10px; text-transform: uppercase; letter-spacing: 1px; font-weight: 500;">
-                                    Tu código es
-                                </div>
-                                <div style="font-size: 42px; font-weight: bold; color: #e28774; letter-spacing: 8px; font-family: 'Courier New', monospace;">
-                                    {code}
-                                </div>
-                            </div>
-                            
-                            <!-- Info Box -->
-                            <div style="background-color: rgba(226, 135, 116, 0.08); border-left: 4px solid #e28774; padding: 15px 20px; border-radius: 6px; margin: 30px 0;">
-                                <p style="margin: 0; color: #4b5563; font-size: 14px; line-height: 1.6;">
-                                    ⏱️ <strong style="color: #1c2220;">Este código es válido por 10 minutos.</strong><br>
-                                    🔒 Por tu seguridad, nunca compartas este código con nadie.
-                                </p>
-                            </div>
-                            
-                            <p style="margin: 30px 0 0 0; color: #6b7280; font-size: 14px; line-height: 1.5;">
-                                Si no solicitaste este código, puedes ignorar este mensaje de forma segura.
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background-color: #f9fafb; padding: 30px; text-align: center; border-top: 1px solid #e5e7eb;">
-                            <p style="margin: 0 0 10px 0; color: #6b7280; font-size: 14px;">
-                                Saludos,<br>
-                                <strong style="color: #e28774;">El equipo de Petfans 🐾</strong>
-                            </p>
-                            <p style="margin: 15px 0 0 0; color: #9ca3af; font-size: 12px;">
-                                © 2025 Petfans. Todos los derechos reservados.
-                            </p>
-                        </td>
-                    </tr>
-                </table>
-            </td>
-        </tr>
-    </table>
-</body>
-</html>
-            '''.strip()
-
-            resend.api_key = settings.RESEND_API_KEY
-            resend.Emails.send({
-                'from': settings.DEFAULT_FROM_EMAIL,
-                'to': [email],
-                'subject': 'Tu código de acceso a Petfans',
-                'html': html_content,
-            })
-            
-        except Exception as e:
-            return Response({'error': 'No se pudo enviar el correo', 'details': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Plantilla precompilada (core.emails); el envío va en segundo plano (core.email_queue)
+        message = build_login_code_email(email, code, request)
+        # No bloquear el worker con el proveedor: los fallos se registran en el log
+        send_async(message)
 
         return Response({'message': 'Código enviado al correo electrónico'}, status=status.HTTP_201_CREATED)
 
 
 class VerifyLoginCode(APIView):
+    throttle_classes = [AuthIPThrottle, AuthEmailThrottle]
+    throttle_scope = 'verify_code'
+
     def post(self, request):
         email = request.data.get('email')
         code = request.data.get('code')
@@ -412,41 +596,29 @@ class VerifyLoginCode(APIView):
         if not email or not code:
             return Response({'error': 'Email and code are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Check if a valid code exists
-        time_threshold = timezone.now() - timedelta(minutes=10)
-        try:
-            login_code = LoginCode.objects.get(
-                email=email,
-                code=code,
-                used=False,
-                created_at__gte=time_threshold
-            )
-
-            login_code.used = True
-            login_code.save()
-
-            user, created = User.objects.get_or_create(
-                username=email,
-                defaults={'email': email}
-            )
+        # Consume the code if it is valid (single use, atomic)
+        if not get_login_code_store().consume(email, code):
+            return Response({'error': 'Invalid or expired code'}, status=status.HTTP_400_BAD_REQUEST)
 
-            refresh = RefreshToken.for_user(user)
+        user, created = User.objects.get_or_create(
+            username=email,
+            defaults={'email': email}
+        )
 
-            profile, _ = UserProfile.objects.get_or_create(user=user)
+        refresh = RefreshToken.for_user(user)
 
-            # Verifica si falta completar nombre o teléfono
-            profile_incomplete = not (profile.full_name and profile.phone_number)
+        profile, _ = UserProfile.objects.get_or_create(user=user)
 
-            return Response({
-                'message': 'Code verified successfully',
-                'user_id': user.id,
-                'access': str(refresh.access_token),
-                'refresh': str(refresh),
-                'onboarding_required': profile_incomplete
-            }, status=status.HTTP_200_OK)
+        # Verifica si falta completar nombre o teléfono
+        profile_incomplete = not (profile.full_name and profile.phone_number)
 
-        except LoginCode.DoesNotExist:
-            return Response({'error': 'Invalid or expired code'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'message': 'Code verified successfully',
+            'user_id': user.id,
+            'access': str(refresh.access_token),
+            'refresh': str(refresh),
+            'onboarding_required': profile_incomplete
+        }, status=status.HTTP_200_OK)
         
 
 class UserProfileView(APIView):
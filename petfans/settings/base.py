@@ -108,8 +108,41 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    # Proxies de confianza delante de la app: la IP del throttling se toma de
+    # X-Forwarded-For solo en esa posición (0 = REMOTE_ADDR, p. ej. en local)
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
+    # Límite por IP y por email de los endpoints de login (core/throttling.py)
+    'DEFAULT_THROTTLE_RATES': {
+        'request_code_ip': '30/h',
+        'request_code_email': '5/h',
+        'verify_code_ip': '60/h',
+        'verify_code_email': '10/h',
+    },
+}
+
+# Días de anticipación de los recordatorios automáticos de vacunas (cada usuario puede
+# sobrescribirlos en UserProfile.reminder_days_before)
+VACCINE_REMINDER_DAYS_BEFORE = [7, 1]
+
+# Reintentos de recordatorios fallidos (core.NotificationOutbox): backoff exponencial
+# con jitter desde REMINDER_RETRY_BASE_SECONDS hasta REMINDER_RETRY_MAX_SECONDS y
+# dead-letter al llegar a REMINDER_MAX_ATTEMPTS intentos
+REMINDER_MAX_ATTEMPTS = 5
+REMINDER_RETRY_BASE_SECONDS = 60
+REMINDER_RETRY_MAX_SECONDS = 60 * 60
+
+# Backend de entrega por canal (ver core/notifications.py). SMS y push no tienen
+# proveedor todavía: sus envíos fallan y quedan en el outbox para reintento
+NOTIFICATION_BACKENDS = {
+    'email': 'core.notifications.EmailBackend',
+    'sms': 'core.notifications.UnavailableBackend',
+    'push': 'core.notifications.UnavailableBackend',
 }
 
+# Almacenamiento de los códigos de login (core/login_codes.py): tabla LoginCode por
+# defecto o core.login_codes.CacheLoginCodeStore para guardarlos en la caché con TTL
+LOGIN_CODE_STORE = os.environ.get('LOGIN_CODE_STORE', 'core.login_codes.ModelLoginCodeStore')
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=7),
     'AUTH_HEADER_TYPES': ('Bearer',),
@@ -117,5 +150,37 @@ SIMPLE_JWT = {
 
 
 
+# Caché: Redis si hay REDIS_URL (compartida entre workers y réplicas); si no, memoria local.
+# Con más de un proceso REDIS_URL es obligatoria: la versión del catálogo, los contadores del
+# throttling y los códigos en caché son por proceso con memoria local (ver core/catalog.py)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 RESEND_API_KEY = os.environ.get('RESEND_API_KEY')
+# Con RESEND_API_KEY todo el correo (login y recordatorios) sale por la API de Resend con
+# una sesión HTTP persistente y envío por lotes (core/mailer.py)
+if RESEND_API_KEY:
+    EMAIL_BACKEND = 'core.mailer.ResendEmailBackend'
+RESEND_TIMEOUT = 10
+RESEND_POOL_SIZE = 10
+
+# URL pública del logo de los correos; vacía usa el estático core/img/petfans-logo.png
+# servido por esta API (core/emails.py). Obligatoria y https en producción (prod.py)
+EMAIL_LOGO_URL = os.environ.get('EMAIL_LOGO_URL', '')
+
+# Correos de las vistas (código de login) en segundo plano (core/email_queue.py)
+EMAIL_ASYNC = True
+EMAIL_QUEUE_MAX_SIZE = 1000
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'PetFans <noreply@petfans.app>')
\ No newline at end of file
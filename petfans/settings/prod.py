@@ -43,6 +43,15 @@ else:
         }
     }
 
+# El logo de los correos necesita una URL https fija: detrás del proxy TLS de Railway la
+# petición llega por http y build_absolute_uri generaría un enlace http:// (core/emails.py)
+EMAIL_LOGO_URL = os.environ.get('EMAIL_LOGO_URL', '')
+if not EMAIL_LOGO_URL.startswith('https://'):
+    raise ValueError("EMAIL_LOGO_URL environment variable must be an https:// URL in production")
+
+# Railway pone un proxy delante: la IP del cliente es la última de X-Forwarded-For
+REST_FRAMEWORK['NUM_PROXIES'] = int(os.environ.get('NUM_PROXIES', '1'))
+
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True